@@ -0,0 +1,65 @@
+"""Per-call latency of the /review authorisation check.
+
+Compares the old connect-per-query helper against the pooled helper in
+utils.db, with the permission cache both cold and warm. Run from the repository root:
+
+    python -m benchmarks.bench_auth_check [iterations]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+from utils import db
+
+GUILD_ID = 1
+OWNER_ID = 42
+STRANGER_ID = 99
+
+
+async def connect_per_call(path, guild_id, user_id):
+    # Verbatim copy of is_owner_or_reviewer before pooling.
+    async with aiosqlite.connect(path) as conn:
+        async with conn.execute("SELECT 1 FROM owners WHERE guild_id=? AND user_id=?", (guild_id, user_id)) as cur:
+            if await cur.fetchone():
+                return True
+        async with conn.execute("SELECT 1 FROM reviewers WHERE guild_id=? AND user_id=?", (guild_id, user_id)) as cur:
+            return await cur.fetchone() is not None
+
+
+async def uncached_check(guild_id, user_id):
+    db.permission_cache.clear()
+    return await db.is_owner_or_reviewer(guild_id, user_id)
+
+
+async def measure(label, check, iterations):
+    samples = []
+    for i in range(iterations):
+        user_id = OWNER_ID if i % 2 else STRANGER_ID
+        start = time.perf_counter()
+        await check(GUILD_ID, user_id)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<20} mean {statistics.fmean(samples):8.1f} us   p50 {samples[len(samples) // 2]:8.1f} us   p99 {p99:8.1f} us")
+
+
+async def main(iterations):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        await db.init_db(path)
+        await db.add_owner(GUILD_ID, OWNER_ID)
+        try:
+            await measure("connect per call", lambda g, u: connect_per_call(path, g, u), iterations)
+            await measure("pooled, cache cold", uncached_check, iterations)
+            await measure("pooled, cache warm", db.is_owner_or_reviewer, iterations)
+        finally:
+            await db.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,68 @@
+"""Approving 1,000 submissions one at a time versus with the batch API.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_batch_approve [count]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from utils import db
+
+GUILD_ID = 1
+
+
+async def seed(count):
+    ids = []
+    for user_id in range(count):
+        await db.add_submission(user_id, GUILD_ID, f"user{user_id}", user_id, "img1", "img2")
+    after_id = 0
+    while True:
+        page = await db.get_pending_submissions(GUILD_ID, after_id, limit=1000)
+        if not page:
+            return ids
+        ids.extend(row[0] for row in page)
+        after_id = page[-1][0]
+
+
+async def leaderboard_rows():
+    async with db._read() as conn:
+        async with conn.execute("SELECT COUNT(*) FROM leaderboard WHERE guild_id=?", (GUILD_ID,)) as cur:
+            return (await cur.fetchone())[0]
+
+
+async def run(label, approve, count):
+    with tempfile.TemporaryDirectory() as tmp:
+        await db.init_db(os.path.join(tmp, "bench.db"))
+        try:
+            ids = await seed(count)
+            start = time.perf_counter()
+            await approve(ids)
+            elapsed = time.perf_counter() - start
+            rows = await leaderboard_rows()
+        finally:
+            await db.close_db()
+    print(f"{label:<12} {elapsed * 1000:9.1f} ms total   {elapsed / count * 1e6:8.1f} us/approval   {rows} leaderboard rows")
+
+
+async def one_at_a_time(ids):
+    for submission_id in ids:
+        await db.approve_submission(submission_id)
+
+
+async def concurrent_double_click(ids):
+    # Two reviewers approving the same batch at once must not duplicate rows.
+    await asyncio.gather(db.approve_submissions(ids), db.approve_submissions(ids))
+
+
+async def main(count):
+    await run("one by one", one_at_a_time, count)
+    await run("batch", db.approve_submissions, count)
+    await run("batch x2", concurrent_double_click, count)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,137 @@
+"""Replay concurrent /submit, /review and /post flows against a temp database.
+
+Every flow runs through the real command callbacks, views and DM wizard
+via benchmarks.harness, with a fixed seed so runs are comparable. Reports
+throughput, p50/p99 latency per step and connection pool contention for
+each phase, then the paginator embed cost cold versus cached. Run from
+the repository root:
+
+    python -m benchmarks.bench_flows [users] [guilds] [rtt_ms]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+from utils import db, paginator
+
+SEED = 1234
+POSTS_PER_GUILD = 20
+
+
+def report(phase, flows, elapsed, latencies, before):
+    print(f"\n{phase}: {flows} flows in {elapsed:.2f} s   {flows / elapsed:9.1f} flows/s")
+    for label in latencies.samples:
+        s = latencies.summary(label)
+        print(
+            f"  {label:<16} n={s['count']:<6} p50 {s['p50'] * 1000:8.2f} ms   "
+            f"p99 {s['p99'] * 1000:8.2f} ms   max {s['max'] * 1000:8.2f} ms"
+        )
+    for mode, c in harness.pool_contention(before, harness.pool_snapshot()).items():
+        print(
+            f"  pool {mode:<11} {c['acquired']:>6} acquisitions   mean wait {c['mean_wait'] * 1000:7.3f} ms   "
+            f"{c['waited']:6.1%} waited >1 ms   mean held {c['mean_held'] * 1000:7.3f} ms"
+        )
+
+
+async def submit_flow(bot, user, guild, rng, latencies):
+    start = time.perf_counter()
+    interaction = bot.interaction(user)
+    response = await latencies.timed("/submit", bot.run_command("submit", interaction))
+    select = bot.interaction(user)
+    await latencies.timed("guild select", response.view.select.choose(select, guild.id))
+    steps = (
+        bot.dm(user, user.name),
+        bot.dm(user, str(rng.randrange(1, 1_000_000))),
+        bot.dm(user, attachments=[harness.FakeAttachment(f"https://cdn.test/{user.id}/1.png", harness.proof_image(rng))]),
+        bot.dm(user, attachments=[harness.FakeAttachment(f"https://cdn.test/{user.id}/2.png", harness.proof_image(rng))]),
+    )
+    for message in steps:
+        await latencies.timed("wizard step", bot.on_message(message))
+    latencies.add("submit flow", time.perf_counter() - start)
+
+
+async def review_flow(bot, reviewer, guild, latencies):
+    start = time.perf_counter()
+    response = await latencies.timed("/review", bot.run_command("review", bot.interaction(reviewer, guild)))
+    view = response.view
+    # Two reviewers work each guild at once, so some pages race.
+    while view is not None and view.page:
+        click = bot.interaction(reviewer, guild)
+        await latencies.timed("approve page", view.approve_page.callback(click))
+    latencies.add("review flow", time.perf_counter() - start)
+
+
+async def post_flow(bot, owner, guild, window, latencies):
+    await latencies.timed("/post", bot.run_command("post", bot.interaction(owner, guild), window=window))
+
+
+async def run(users, guilds, rtt):
+    rng = harness.seeded(SEED)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = await harness.start(os.path.join(tmp, "bench.db"), os.path.join(tmp, "proofs"), rtt)
+        try:
+            owners, second = {}, {}
+            for guild_id in range(1, guilds + 1):
+                owner_id = 10_000_000 + guild_id
+                guild, _ = bot.add_guild(guild_id, owner_id)
+                owners[guild_id] = bot.add_user(owner_id, guild)
+                second[guild_id] = bot.add_user(20_000_000 + guild_id, guild)
+                await db.add_guild_owners([(guild_id, owner_id)])
+                await db.add_owner(guild_id, second[guild_id].id)
+            members = []
+            for user_id in range(1, users + 1):
+                guild = bot.get_guild(rng.randrange(1, guilds + 1))
+                members.append((bot.add_user(user_id, guild), guild))
+
+            latencies = harness.Latencies()
+            before = harness.pool_snapshot()
+            start = time.perf_counter()
+            await asyncio.gather(*(submit_flow(bot, user, guild, rng, latencies) for user, guild in members))
+            report("submit", users, time.perf_counter() - start, latencies, before)
+
+            latencies = harness.Latencies()
+            before = harness.pool_snapshot()
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                review_flow(bot, reviewer, bot.get_guild(guild_id), latencies)
+                for guild_id in owners for reviewer in (owners[guild_id], second[guild_id])
+            ))
+            report("review", guilds * 2, time.perf_counter() - start, latencies, before)
+
+            for guild_id, owner in owners.items():
+                await bot.run_command("setchannel", bot.interaction(owner, bot.get_guild(guild_id)), channel=bot.get_channel(guild_id))
+            latencies = harness.Latencies()
+            before = harness.pool_snapshot()
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                post_flow(bot, owners[guild_id], bot.get_guild(guild_id), rng.choice(("all", "daily", "weekly")), latencies)
+                for guild_id in owners for _ in range(POSTS_PER_GUILD)
+            ))
+            report("post", guilds * POSTS_PER_GUILD, time.perf_counter() - start, latencies, before)
+
+            rows = await db.get_leaderboard(1, 100)
+            embeds = harness.Latencies()
+            for _ in range(200):
+                paginator.embed_cache.clear()
+                for label in ("embed cold", "embed cached"):
+                    t = time.perf_counter()
+                    paginator.cached_leaderboard_embed(1, rows, per_page=25)
+                    embeds.add(label, time.perf_counter() - t)
+            print(f"\npaginator ({len(rows)} rows):")
+            for label in embeds.samples:
+                s = embeds.summary(label)
+                print(f"  {label:<16} p50 {s['p50'] * 1e6:8.1f} us   p99 {s['p99'] * 1e6:8.1f} us")
+            print(f"\ngateway calls: {bot.gateway.calls}   DMs sent: {bot.notifier.sent}")
+        finally:
+            await harness.stop(bot)
+
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    users = int(args[0]) if len(args) > 0 else 2000
+    guilds = int(args[1]) if len(args) > 1 else 20
+    rtt = args[2] / 1000 if len(args) > 2 else 0.0
+    asyncio.run(run(users, guilds, rtt))
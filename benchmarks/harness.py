@@ -0,0 +1,346 @@
+"""Local stand-ins for the Discord gateway so command flows can be replayed.
+
+``SimulatedBot`` is the real LeaderboardBot with its gateway lookups
+(guilds, users, channels) answered from in-memory fakes, so slash command
+callbacks, views and the DM wizard run unchanged against a temp database.
+Every fake REST call (send, edit, defer, DM) sleeps for ``rtt`` seconds to
+stand in for Discord round trips and records what was sent.
+"""
+import asyncio
+import io
+import os
+import random
+import time
+
+# Keep the simulation from binding the real health port or pacing DMs at
+# production rates; set before the package modules read them.
+os.environ.setdefault("PORT", "0")
+os.environ.setdefault("HEALTH_HOST", "127.0.0.1")
+os.environ.setdefault("DM_RATE", "100000")
+os.environ.setdefault("DM_CONCURRENCY", "64")
+os.environ.setdefault("NOTIFY_COALESCE_WINDOW", "0.05")
+os.environ.setdefault("LIVE_DEBOUNCE", "0.05")
+os.environ.setdefault("LIVE_MIN_INTERVAL", "0.1")
+os.environ.setdefault("USER_RATE_LIMIT", "0")
+os.environ.setdefault("GUILD_RATE_LIMIT", "0")
+os.environ.setdefault("WIZARD_LIMIT", "0")
+os.environ.setdefault("OUTBOUND_RATE", "100000")
+
+import discord
+from PIL import Image
+
+from leaderboard.client import LeaderboardBot
+from utils import db, storage
+from utils.proofs import ProofCache
+
+
+class Gateway:
+    """Shared clock and log of every fake API call."""
+
+    def __init__(self, rtt=0.0):
+        self.rtt = rtt
+        self.calls = 0
+        self.sent = []
+
+    async def call(self, kind, payload=None):
+        self.calls += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        self.sent.append((kind, payload))
+
+
+class FakeMessage:
+    _next_id = 1
+
+    def __init__(self, gateway, channel, author=None, content="", attachments=(), embed=None):
+        self.id = FakeMessage._next_id
+        FakeMessage._next_id += 1
+        self.gateway = gateway
+        self.channel = channel
+        self.guild = getattr(channel, "guild", None)
+        self.author = author
+        self.content = content
+        self.attachments = list(attachments)
+        self.embed = embed
+
+    async def edit(self, **kwargs):
+        await self.gateway.call("message.edit", kwargs)
+        self.embed = kwargs.get("embed", self.embed)
+        return self
+
+
+class FakeChannel:
+    """A guild text channel or a user's DM channel."""
+
+    def __init__(self, gateway, channel_id, guild=None, name="leaderboard"):
+        self.gateway = gateway
+        self.id = channel_id
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{channel_id}>"
+        self.messages = {}
+
+    async def send(self, content=None, **kwargs):
+        await self.gateway.call("channel.send", content)
+        message = FakeMessage(self.gateway, self, content=content or "", embed=kwargs.get("embed"))
+        self.messages[message.id] = message
+        return message
+
+    def get_partial_message(self, message_id):
+        message = self.messages.get(message_id)
+        if message is None:
+            return _MissingMessage()
+        return message
+
+
+class _MissingMessage:
+    async def edit(self, **kwargs):
+        raise discord.NotFound(_FakeResponse(404), "Unknown Message")
+
+
+class _FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Not Found"
+
+
+class FakeUser:
+    def __init__(self, gateway, user_id, name=None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.dm_channel = FakeChannel(gateway, user_id, name="dm")
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, **kwargs):
+        return await self.dm_channel.send(content, **kwargs)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, owner_id, name=None):
+        self.id = guild_id
+        self.owner_id = owner_id
+        self.name = name or f"guild{guild_id}"
+        self.members = set()
+
+    def get_member(self, user_id):
+        return user_id if user_id in self.members else None
+
+
+class FakeAttachment:
+    def __init__(self, url, data):
+        self.url = url
+        self.size = len(data)
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._done = False
+        self.view = None
+        self.modal = None
+
+    def is_done(self):
+        return self._done
+
+    async def _reply(self, kind, kwargs):
+        if self._done:
+            raise discord.InteractionResponded(self.interaction)
+        self._done = True
+        await self.interaction.gateway.call(kind, kwargs)
+        self.view = kwargs.get("view") or self.view
+
+    async def send_message(self, content=None, **kwargs):
+        await self._reply("interaction.send_message", dict(kwargs, content=content))
+
+    async def edit_message(self, **kwargs):
+        await self._reply("interaction.edit_message", kwargs)
+
+    async def defer(self, **kwargs):
+        await self._reply("interaction.defer", kwargs)
+
+    async def send_modal(self, modal):
+        self.modal = modal
+        await self._reply("interaction.send_modal", {})
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.gateway.call("followup.send", content)
+
+
+class FakeInteraction:
+    def __init__(self, client, user, guild=None):
+        self.client = client
+        self.gateway = client.gateway
+        self.user = user
+        self.guild = guild
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+
+class SimulatedBot(LeaderboardBot):
+    """LeaderboardBot wired to in-memory guilds, users and channels."""
+
+    def __init__(self, gateway, proof_root):
+        super().__init__(command_prefix="!", intents=discord.Intents.none())
+        self.gateway = gateway
+        self.proofs = ProofCache(proof_root)
+        self._guilds = {}
+        self._users = {}
+        self._channels = {}
+
+    @property
+    def guilds(self):
+        return list(self._guilds.values())
+
+    @property
+    def latency(self):
+        return self.gateway.rtt
+
+    def is_ready(self):
+        return True
+
+    def get_guild(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    def get_user(self, user_id):
+        return self._users.get(user_id)
+
+    async def fetch_user(self, user_id):
+        return self._users[user_id]
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    async def sync_commands(self):
+        return False
+
+    async def process_commands(self, message):
+        # No prefix commands are registered, and fakes carry no gateway state.
+        pass
+
+    def add_guild(self, guild_id, owner_id):
+        guild = self._guilds[guild_id] = FakeGuild(guild_id, owner_id)
+        channel = self._channels[guild_id] = FakeChannel(self.gateway, guild_id, guild)
+        return guild, channel
+
+    def add_user(self, user_id, *guilds):
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = FakeUser(self.gateway, user_id)
+        for guild in guilds:
+            guild.members.add(user_id)
+        return user
+
+    def interaction(self, user, guild=None):
+        return FakeInteraction(self, user, guild)
+
+    def dm(self, user, content="", attachments=()):
+        return FakeMessage(self.gateway, user.dm_channel, user, content, attachments)
+
+    async def run_command(self, name, interaction, **options):
+        await self.tree.get_command(name).callback(interaction, **options)
+        return interaction.response
+
+
+def proof_image(rng, size=48):
+    """Random-noise PNG, distinct per call so proofs are never flagged as reused."""
+    image = Image.frombytes("L", (size, size), rng.randbytes(size * size))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class Latencies:
+    """Per-label latency samples in seconds."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, label, seconds):
+        self.samples.setdefault(label, []).append(seconds)
+
+    async def timed(self, label, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.add(label, time.perf_counter() - start)
+
+    def summary(self, label):
+        samples = sorted(self.samples.get(label, ()))
+        if not samples:
+            return None
+        return {
+            "count": len(samples),
+            "p50": samples[len(samples) // 2],
+            "p99": samples[max(int(len(samples) * 0.99) - 1, 0)],
+            "max": samples[-1],
+        }
+
+
+def pool_snapshot():
+    """Copy of the connection pool wait/held histograms, keyed by mode."""
+    snapshot = {}
+    for name, histogram in (("wait", storage.POOL_WAIT), ("held", storage.POOL_HELD)):
+        for (mode,), (counts, total, sum_) in histogram.series.items():
+            snapshot[name, mode] = (list(counts), total, sum_)
+    return snapshot
+
+
+def pool_contention(before, after, threshold=0.001):
+    """Acquisitions, mean wait and share of waits over ``threshold`` between two snapshots."""
+    report = {}
+    for mode in ("read", "write"):
+        counts, total, sum_ = after.get(("wait", mode), ([0] * (len(storage.POOL_WAIT.buckets) + 1), 0, 0.0))
+        old_counts, old_total, old_sum = before.get(("wait", mode), ([0] * len(counts), 0, 0.0))
+        acquired = total - old_total
+        if not acquired:
+            continue
+        fast = sum(
+            new - old for bound, new, old in zip(storage.POOL_WAIT.buckets, counts, old_counts) if bound <= threshold
+        )
+        _, held_total, held_sum = after.get(("held", mode), ([], 0, 0.0))
+        _, old_held_total, old_held_sum = before.get(("held", mode), ([], 0, 0.0))
+        held = held_total - old_held_total
+        report[mode] = {
+            "acquired": acquired,
+            "mean_wait": (sum_ - old_sum) / acquired,
+            "waited": (acquired - fast) / acquired,
+            "mean_held": (held_sum - old_held_sum) / held if held else 0.0,
+        }
+    return report
+
+
+async def start(path, proof_root, rtt=0.0):
+    bot = SimulatedBot(Gateway(rtt), proof_root)
+    await db.init_db(path)
+    await bot.start_services()
+    return bot
+
+
+async def stop(bot):
+    await bot.stop_services()
+    await bot.close_database()
+
+
+def seeded(seed):
+    return random.Random(seed)
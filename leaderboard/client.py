@@ -0,0 +1,185 @@
+import discord
+from discord.ext import commands
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from leaderboard import commands as slash_commands
+from utils import db, instrument
+from utils.admission import Admission
+from utils.health import HealthServer
+from utils.ingest import SubmissionIngestor
+from utils.liveboard import LiveBoards
+from utils.maintenance import Maintenance
+from utils.notifier import Notifier
+from utils.proofs import ProofCache
+from utils.wizard import SubmissionWizard
+
+log = logging.getLogger(__name__)
+
+# Leave SHARD_IDS unset to run every shard in this process (Discord picks the
+# count unless SHARD_COUNT is set). To split shards across processes, give
+# each one the same SHARD_COUNT and its own SHARD_IDS, e.g. "0-3" or "4,5".
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = os.getenv("SHARD_IDS", "")
+# Share cache invalidations with other processes even when this one runs
+# every shard, e.g. a second deployment on the same PostgreSQL database.
+CACHE_BUS = os.getenv("CACHE_BUS", "").lower() in ("1", "true", "yes")
+
+
+def parse_shard_ids(spec):
+    ids = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        first, _, last = part.partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(ids)) or None
+
+
+def shard_for(guild_id, shard_count):
+    """The shard Discord routes a guild's events to."""
+    return (guild_id >> 22) % shard_count
+
+
+def default_intents():
+    intents = discord.Intents.all()
+    intents.message_content = True
+    intents.guilds = True
+    intents.members = True
+    return intents
+
+
+class LeaderboardBot(commands.AutoShardedBot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.admission = Admission(self)
+        self.notifier = Notifier(self)
+        self.ingestor = SubmissionIngestor()
+        self.proofs = ProofCache()
+        self.health = HealthServer(self)
+        self.wizards = SubmissionWizard(self)
+        self.live_boards = LiveBoards(self)
+        self.maintenance = Maintenance()
+        self.booted = time.perf_counter()
+        self.startup_timings = {}
+        self.guilds_registered = False
+        slash_commands.setup(self.tree)
+
+    async def timed(self, phase, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.startup_timings[phase] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def setup_hook(self):
+        # setup_hook runs once per process; on_ready fires again on every
+        # reconnect, so one-off startup work lives here.
+        await self.start_services()
+
+    async def start_services(self):
+        await asyncio.gather(
+            self.prepare_database(),
+            self.timed("proof_cache", self.proofs.load()),
+            self.timed("health_server", self.health.start()),
+        )
+        self.notifier.start()
+        self.ingestor.start()
+        if self.hosts_dms:
+            self.wizards.start()
+        self.live_boards.start()
+        self.maintenance.start()
+
+    @property
+    def split_shards(self):
+        """True when other processes run some of this bot's shards."""
+        return self.shard_ids is not None and len(self.shard_ids) < self.shard_count
+
+    @property
+    def hosts_dms(self):
+        # DMs, and so every /submit wizard, arrive on shard 0.
+        return self.shard_ids is None or 0 in self.shard_ids
+
+    def owns_guild(self, guild_id):
+        """Whether this process runs the shard that handles ``guild_id``."""
+        return not self.split_shards or shard_for(guild_id, self.shard_count) in self.shard_ids
+
+    async def prepare_database(self):
+        await self.timed("schema", db.init_db())
+        if self.split_shards or CACHE_BUS:
+            await self.timed("cache_bus", db.start_cache_bus())
+        # Only this process's guilds; anything else loads on first /rank.
+        await self.timed("rank_index", db.load_rank_index(self.owns_guild))
+        # Only the DM shard's process syncs commands and runs wizards, so
+        # processes starting together don't repeat the work.
+        if self.hosts_dms:
+            await asyncio.gather(
+                self.timed("command_sync", self.sync_commands()),
+                self.timed("wizards", self.wizards.load()),
+            )
+
+    async def sync_commands(self):
+        """Sync the command tree only if its definitions changed since the last sync."""
+        payload = json.dumps(
+            [self.application_id] + [command.to_dict(self.tree) for command in self.tree.get_commands()],
+            sort_keys=True, default=str
+        )
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        if await db.get_meta("command_tree_hash") == digest:
+            return False
+        await self.tree.sync()
+        await db.set_meta("command_tree_hash", digest)
+        log.info("command tree synced", extra={"commands": len(self.tree.get_commands())})
+        return True
+
+    async def close(self):
+        # Queued DMs and live-board edits still need the HTTP session, so
+        # they drain before discord.py closes it; events that arrive
+        # meanwhile may still touch the database, so it closes last.
+        await self.stop_services()
+        await super().close()
+        await self.close_database()
+
+    async def stop_services(self):
+        await self.health.stop()
+        await self.maintenance.stop()
+        await self.wizards.stop()
+        await self.ingestor.stop()
+        await self.live_boards.stop()
+        await self.notifier.stop()
+
+    async def close_database(self):
+        await db.close_db()
+        instrument.profiler.dump()
+
+    async def on_ready(self):
+        if self.guilds_registered:
+            log.info("gateway reconnected", extra={"guilds": len(self.guilds)})
+            return
+        self.guilds_registered = True
+        owners = await self.timed("guild_owners", db.add_guild_owners((guild.id, guild.owner_id) for guild in self.guilds))
+        log.info("startup complete", extra={
+            "user": str(self.user),
+            "shards": self.shard_ids or list(range(self.shard_count or 1)),
+            "guilds": len(self.guilds),
+            "owners_registered": owners,
+            "timings_ms": self.startup_timings,
+            "ready_ms": round((time.perf_counter() - self.booted) * 1000, 1),
+        })
+
+    async def on_guild_join(self, guild: discord.Guild):
+        await db.add_guild_owners([(guild.id, guild.owner_id)])
+
+    async def on_message(self, message: discord.Message):
+        if message.guild is None and not message.author.bot:
+            await self.wizards.handle(message)
+        await self.process_commands(message)
+
+
+def create_bot(shard_ids=SHARD_IDS, shard_count=SHARD_COUNT):
+    if isinstance(shard_ids, str):
+        shard_ids = parse_shard_ids(shard_ids)
+    if shard_ids is not None and shard_count is None:
+        raise ValueError("SHARD_IDS needs SHARD_COUNT so every process agrees on guild placement.")
+    return LeaderboardBot(command_prefix="!", intents=default_intents(), shard_ids=shard_ids, shard_count=shard_count)
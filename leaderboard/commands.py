@@ -0,0 +1,386 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import logging
+import math
+import os
+from utils import db, exporters, instrument, paginator, ranks, windows
+from leaderboard.views import GuildSelectView, QuickSubmitModal, ReviewQueueView
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+# Discord caps an embed at 25 fields.
+PAGE_SIZE = 25
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+async def admitted(interaction, action):
+    """Charge ``action`` to the caller's rate limits, replying with the wait if refused."""
+    guild_id = interaction.guild.id if interaction.guild is not None else None
+    wait = await interaction.client.admission.check(action, interaction.user.id, guild_id)
+    if wait:
+        await interaction.response.send_message(f"⏳ Slow down! Try again in {math.ceil(wait)}s.", ephemeral=True)
+        return False
+    return True
+
+@app_commands.command(name="submit", description="Submit your score")
+@instrument.command
+async def submit(interaction: discord.Interaction):
+    if interaction.guild is not None:
+        await interaction.response.send_message("❌ Please use this command in DMs.", ephemeral=True)
+        return
+    if not await admitted(interaction, "submit"):
+        return
+
+    # The rest of the flow is driven by SubmissionWizard from on_message,
+    # so nothing here waits on the user.
+    await interaction.response.send_message(
+        "🔹 Select the **guild** you're submitting for:", view=GuildSelectView(interaction.client, interaction.user)
+    )
+
+@app_commands.command(name="quicksubmit", description="Submit your score and both image proofs in one step")
+@app_commands.describe(proof1="First image proof", proof2="Second image proof")
+@app_commands.guild_only()
+@instrument.command
+async def quicksubmit(interaction: discord.Interaction, proof1: discord.Attachment, proof2: discord.Attachment):
+    if not await admitted(interaction, "quicksubmit"):
+        return
+    await interaction.response.send_modal(QuickSubmitModal(interaction.guild.id, [proof1, proof2]))
+
+@app_commands.command(name="review", description="Review pending submissions")
+@instrument.command
+async def review(interaction: discord.Interaction):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized to review submissions.", ephemeral=True)
+        return
+    if not await admitted(interaction, "review"):
+        return
+
+    view = ReviewQueueView(interaction.client, guild_id, interaction.user)
+    await view.load(0)
+    if not view.page:
+        await interaction.response.send_message("✅ No pending submissions found.", ephemeral=True)
+        return
+
+    embed, proof = view.render()
+    await interaction.response.send_message(
+        embed=embed, view=view, file=proof or discord.utils.MISSING, ephemeral=True
+    )
+
+@app_commands.command(name="banuser", description="Ban a user from the server")
+@app_commands.describe(member="User to ban", reason="Reason for the ban")
+@commands.has_permissions(ban_members=True)
+@instrument.command
+async def banuser(ctx: discord.Interaction, member: discord.Member, reason:str="No reason provided"):
+    try:
+        dm_message = f"You have been banned from {ctx.guild.name} for: {reason}"
+        await member.send(dm_message)
+    except discord.Forbidden:
+        await ctx.response.send_message("Couldn't send DM to the user. Proceeding with ban.")
+
+    await member.ban(reason=reason)
+    await ctx.response.send_message(f"{member} has been banned.")
+
+@app_commands.command(name="addowner", description="Add a new owner who can review and manage settings.")
+@app_commands.describe(user="User to add as an owner")
+@instrument.command
+async def addowner(interaction: discord.Interaction, user: discord.Member):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+
+    await db.add_owner(guild_id, user.id)
+    await interaction.response.send_message(f"✅ {user.mention} added as an owner.", ephemeral=True)
+
+@app_commands.command(name="removeowner", description="Remove an owner")
+@app_commands.describe(user="User to remove from owners")
+@instrument.command
+async def removeowner(interaction: discord.Interaction, user: discord.Member):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+
+    await db.remove_owner(guild_id, user.id)
+    await interaction.response.send_message(f"✅ {user.mention} removed from owners.", ephemeral=True)
+
+@app_commands.command(name="setchannel", description="Set the channel where leaderboard will be posted")
+@app_commands.describe(channel="Text channel to post leaderboard")
+@instrument.command
+async def setchannel(interaction: discord.Interaction, channel: discord.TextChannel):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+
+    await db.set_leaderboard_channel(guild_id, channel.id)
+    await interaction.response.send_message(f"📢 Leaderboard channel set to {channel.mention}", ephemeral=True)
+
+@app_commands.command(name="setleaderboardlimit", description="Set how many entries the leaderboard shows")
+@app_commands.describe(limit="Maximum number of scores shown")
+@instrument.command
+async def setleaderboardlimit(interaction: discord.Interaction, limit: int):
+    if limit < 1:
+        await interaction.response.send_message("❌ Limit must be at least 1.", ephemeral=True)
+        return
+
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+
+    await db.set_leaderboard_limit(guild_id, limit)
+    interaction.client.live_boards.schedule(guild_id)
+    await interaction.response.send_message(f"📊 Leaderboard will now show top {limit} scores.", ephemeral=True)
+
+@app_commands.command(name="setresets", description="Set when daily, weekly, monthly and season leaderboards reset")
+@app_commands.describe(
+    reset_hour="UTC hour (0-23) at which each day starts (default: unchanged)",
+    week_start="Day each week starts on (default: unchanged)",
+    season_start="First day of the first season (YYYY-MM-DD), or \"off\" for no seasons (default: unchanged)",
+    season_days="Length of each season in days (default: unchanged)"
+)
+@app_commands.choices(week_start=[app_commands.Choice(name=day, value=i) for i, day in enumerate(DAYS)])
+@app_commands.guild_only()
+@instrument.command
+async def setresets(
+    interaction: discord.Interaction,
+    reset_hour: app_commands.Range[int, 0, 23] = None,
+    week_start: int = None,
+    season_start: str = None,
+    season_days: app_commands.Range[int, 1, 3660] = None
+):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+
+    clear_season = season_start is not None and season_start.strip().lower() == "off"
+    if season_start and not clear_season:
+        try:
+            season_start = datetime.strptime(season_start.strip(), "%Y-%m-%d").date().isoformat()
+        except ValueError:
+            await interaction.response.send_message("❌ Season start must look like 2025-01-31, or \"off\".", ephemeral=True)
+            return
+    else:
+        season_start = None
+
+    config = await db.set_window_config(guild_id, reset_hour, week_start, season_start, season_days, clear_season)
+    seasons = (
+        f"seasons last {config['season_days']} days from {config['season_start']}"
+        if config["season_start"] else "there are no seasons"
+    )
+    await interaction.response.send_message(
+        f"🗓️ Days start at {config['reset_hour']:02d}:00 UTC, weeks start on {DAYS[config['week_start']]}, and {seasons}. "
+        "The current daily, weekly, monthly and season boards were rebuilt with these boundaries; "
+        "past periods keep the ones they had.",
+        ephemeral=True
+    )
+
+@app_commands.command(name="setretention", description="Set how long score history stays live and stays archived")
+@app_commands.describe(
+    history_days="Days scores stay live before archiving (0 = never by age, -1 = bot default; default: unchanged)",
+    archive_days="Days archived scores and review records are kept (0 = forever, -1 = bot default; default: unchanged)"
+)
+@app_commands.guild_only()
+@instrument.command
+async def setretention(
+    interaction: discord.Interaction,
+    history_days: app_commands.Range[int, -1, 36600] = None,
+    archive_days: app_commands.Range[int, -1, 36600] = None
+):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+
+    live, kept = await db.set_retention(guild_id, history_days, archive_days)
+    archived = f"after {live} days or once beaten by the same player" if live else "once beaten by the same player"
+    retained = f"for {kept} days" if kept else "forever"
+    await interaction.response.send_message(
+        f"🗄️ Scores move to the archive {archived}; archived history is kept {retained}. "
+        "Changes apply at the next nightly maintenance run.",
+        ephemeral=True
+    )
+
+@app_commands.command(name="setlimits", description="Set how often members can use commands and how many submissions can run at once")
+@app_commands.describe(
+    per_user="Commands each member may run per minute (0 = unlimited, -1 = bot default; default: unchanged)",
+    per_guild="Commands the whole server may run per minute (0 = unlimited, -1 = bot default; default: unchanged)",
+    wizards="/submit flows that may run at once here (0 = unlimited, -1 = bot default; default: unchanged)"
+)
+@app_commands.guild_only()
+@instrument.command
+async def setlimits(
+    interaction: discord.Interaction,
+    per_user: app_commands.Range[int, -1, 10000] = None,
+    per_guild: app_commands.Range[int, -1, 100000] = None,
+    wizards: app_commands.Range[int, -1, 100000] = None
+):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+
+    await db.set_rate_limits(guild_id, per_user, per_guild, wizards)
+    user_limit, guild_limit, wizard_limit = (
+        value or "unlimited" for value in await interaction.client.admission.limits(guild_id)
+    )
+    await interaction.response.send_message(
+        f"🚦 Limits updated: {user_limit} per member per minute, {guild_limit} per server per minute, "
+        f"{wizard_limit} submissions in progress at once.",
+        ephemeral=True
+    )
+
+@app_commands.command(name="post", description="Post the current leaderboard to the configured channel")
+@app_commands.describe(
+    live="Keep this message updated as submissions are approved",
+    window="Time window to rank (default: all time)"
+)
+@app_commands.choices(window=[app_commands.Choice(name=w, value=w) for w in windows.WINDOWS])
+@instrument.command
+async def post(interaction: discord.Interaction, live: bool = False, window: str = "all"):
+    if live and window != "all":
+        await interaction.response.send_message("❌ Live leaderboards are all-time only.", ephemeral=True)
+        return
+
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+    if not await admitted(interaction, "post"):
+        return
+
+    settings = await db.get_settings(guild_id)
+    if not settings or not settings.get("leaderboard_channel_id"):
+        await interaction.response.send_message("⚙️ No leaderboard channel is set. Use `/setchannel` first.", ephemeral=True)
+        return
+
+    limit = settings.get("submission_limit", 10)
+    channel_id = settings["leaderboard_channel_id"]
+
+    lb_data = await db.get_leaderboard(guild_id, limit, window)
+    log.info("posting leaderboard", extra={
+        "guild_id": guild_id, "channel_id": channel_id, "limit": limit, "window": window, "rows": len(lb_data)
+    })
+    if not lb_data:
+        if window == "season" and not settings.get("season_start"):
+            await interaction.response.send_message("⚙️ No season is configured. Use `/setresets` first.", ephemeral=True)
+        else:
+            await interaction.response.send_message("📭 No leaderboard data found.", ephemeral=True)
+        return
+
+    embed = paginator.cached_leaderboard_embed(guild_id, lb_data, per_page=PAGE_SIZE, window=window)
+
+    channel = interaction.client.get_channel(channel_id)
+    if not channel:
+        await interaction.response.send_message("❌ Could not find the configured leaderboard channel.", ephemeral=True)
+        return
+
+    if live and settings.get("live_message_id"):
+        try:
+            await channel.get_partial_message(settings["live_message_id"]).edit(embed=embed)
+            interaction.client.live_boards.remember(guild_id, lb_data)
+            await interaction.response.send_message(f"🔄 Live leaderboard in {channel.mention} refreshed.", ephemeral=True)
+            return
+        except discord.NotFound:
+            pass
+
+    message = await channel.send(embed=embed)
+    if live:
+        await db.set_live_message(guild_id, message.id)
+        interaction.client.live_boards.remember(guild_id, lb_data)
+        await interaction.response.send_message(
+            f"✅ Live leaderboard posted in {channel.mention}. It updates as submissions are approved; delete it to stop.",
+            ephemeral=True
+        )
+        return
+    await interaction.response.send_message(f"✅ Leaderboard posted in {channel.mention}", ephemeral=True)
+
+@app_commands.command(name="rank", description="Show a player's all-time rank and the players around them")
+@app_commands.describe(member="Player to look up (default: you)")
+@app_commands.guild_only()
+@instrument.command
+async def rank(interaction: discord.Interaction, member: discord.Member = None):
+    if not await admitted(interaction, "rank"):
+        return
+    member = member or interaction.user
+    guild_id = interaction.guild.id
+    standing = await db.get_user_rank(guild_id, member.id)
+    if standing is None:
+        await interaction.response.send_message(f"📭 {member.display_name} has no approved score yet.", ephemeral=True)
+        return
+
+    position, score, total = standing
+    nearby = await db.get_rank_around(guild_id, member.id)
+    embed = discord.Embed(
+        title=f"🏅 {member.display_name}",
+        description=(
+            f"**Rank**: #{position} of {total}\n"
+            f"**Best score**: {score}\n"
+            f"**Percentile**: {ranks.percentile(position, total):.1f}"
+        ),
+        color=discord.Color.gold()
+    )
+    embed.add_field(
+        name="Around them",
+        value="\n".join(
+            f"{'➡️ ' if user_id == member.id else ''}{r}. {username} – **{s}**"
+            for r, user_id, username, s in nearby
+        ),
+        inline=False
+    )
+    # The pager opens on the player's page; "Jump to my page" goes to the caller's.
+    view = paginator.LeaderboardPages(guild_id, interaction.user.id, summary=embed)
+    page = await view.show((position - 1) // view.per_page)
+    await interaction.response.send_message(embeds=[embed, page], view=view, ephemeral=True)
+
+@app_commands.command(name="export", description="Export the full leaderboard history as a file")
+@app_commands.describe(filetype="File format", compress="Compress the file")
+@app_commands.choices(filetype=[app_commands.Choice(name=fmt, value=fmt) for fmt in exporters.FORMATS])
+@app_commands.guild_only()
+@instrument.command
+async def export(interaction: discord.Interaction, filetype: str = "csv", compress: bool = False):
+    guild_id = interaction.guild.id
+    if not await db.is_owner_or_reviewer(guild_id, interaction.user.id):
+        await interaction.response.send_message("⛔ You're not authorized.", ephemeral=True)
+        return
+    if not await admitted(interaction, "export"):
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    exported = await exporters.export_leaderboard(guild_id, filetype, compress)
+    if not exported:
+        await interaction.followup.send("📭 No leaderboard data found.", ephemeral=True)
+        return
+
+    filepath, filename = exported
+    try:
+        await interaction.followup.send(file=discord.File(filepath, filename=filename), ephemeral=True)
+    except discord.HTTPException as e:
+        await interaction.followup.send(f"❌ Could not upload the export: {e}", ephemeral=True)
+    finally:
+        os.remove(filepath)
+
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.MissingPermissions):
+        message = "⛔ You don't have permission to run this command."
+    else:
+        message = f"⚠️ An error occurred: `{error}`"
+    # Commands that defer have already used the initial response.
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+COMMANDS = [
+    submit, quicksubmit, review, banuser, addowner, removeowner,
+    setchannel, setleaderboardlimit, setresets, setretention, setlimits, post, rank, export,
+]
+
+def setup(tree):
+    """Register every slash command and the shared error handler on ``tree``."""
+    for command in COMMANDS:
+        tree.add_command(command)
+    tree.error(on_app_command_error)
@@ -0,0 +1,269 @@
+import asyncio
+import discord
+import logging
+import math
+from utils import db
+from utils.proofs import InvalidProof
+
+log = logging.getLogger(__name__)
+
+PROOF_FILENAME = "proof.jpg"
+
+
+async def ensure_owner(guild_id, user_id):
+    if not await db.has_owner(guild_id):
+        await db.add_owner(guild_id, user_id)
+
+
+class GuildSelect(discord.ui.Select):
+    def __init__(self, client, user):
+        self.user = user
+        options = [
+            discord.SelectOption(label=guild.name, value=str(guild.id))
+            for guild in client.guilds if guild.get_member(user.id)
+        ]
+        super().__init__(placeholder="Choose a guild", options=options)
+
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user != self.user:
+            await interaction.response.send_message("This selection isn't for you.", ephemeral=True)
+            return
+        await self.choose(interaction, int(self.values[0]))
+
+    async def choose(self, interaction, guild_id):
+        if self.view is not None:
+            self.view.stop()
+        admission = interaction.client.admission
+        wait = await admission.check("submit", interaction.user.id, guild_id)
+        if wait:
+            await interaction.response.edit_message(
+                content=f"⏳ That server is receiving a lot of submissions. Try `/submit` again in {math.ceil(wait)}s.",
+                view=None
+            )
+            return
+        prompt = await admission.begin_wizard(interaction.user.id, guild_id)
+        if prompt is None:
+            await interaction.response.edit_message(
+                content="⏳ Too many submissions are in progress for that server. Try `/submit` again in a few minutes.",
+                view=None
+            )
+            return
+        await ensure_owner(guild_id, interaction.user.id)
+        guild = interaction.client.get_guild(guild_id)
+        await interaction.response.edit_message(content=f"🔹 Submitting for **{guild.name if guild else guild_id}**.", view=None)
+        await interaction.followup.send(prompt)
+
+
+class GuildSelectView(discord.ui.View):
+    def __init__(self, client, user):
+        super().__init__(timeout=120)
+        self.select = GuildSelect(client, user)
+        self.add_item(self.select)
+
+
+class QuickSubmitModal(discord.ui.Modal, title="Submit your score"):
+    username = discord.ui.TextInput(label="Username", max_length=100)
+    score = discord.ui.TextInput(label="Score", max_length=18)
+
+    def __init__(self, guild_id, attachments):
+        super().__init__()
+        self.guild_id = guild_id
+        self.attachments = attachments
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            score = int(self.score.value.strip())
+        except ValueError:
+            await interaction.response.send_message("❌ The score must be a whole number.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        client = interaction.client
+        try:
+            proofs = await asyncio.gather(*(client.proofs.fetch(attachment) for attachment in self.attachments))
+        except InvalidProof as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        except Exception:
+            log.exception("storing proofs failed", extra={"guild_id": self.guild_id, "user_id": interaction.user.id})
+            await interaction.followup.send("⚠️ Your proof images couldn't be saved just now. Run `/quicksubmit` again to retry.", ephemeral=True)
+            return
+
+        await ensure_owner(self.guild_id, interaction.user.id)
+        done, reply = await client.wizards.finish(
+            interaction.user,
+            self.guild_id,
+            self.username.value.strip(),
+            score,
+            [attachment.url for attachment in self.attachments],
+            proofs
+        )
+        if not done:
+            reply += " Run `/quicksubmit` again to retry."
+        await interaction.followup.send(reply, ephemeral=True)
+
+
+class ReviewQueueView(discord.ui.View):
+    """Single-message review queue that pages through pending submissions.
+
+    Only one small keyset page is held at a time; ``history`` keeps the
+    cursors of earlier pages so Previous can walk back.
+    """
+
+    def __init__(self, client, guild_id, reviewer):
+        super().__init__(timeout=600)
+        self.client = client
+        self.guild_id = guild_id
+        self.reviewer = reviewer
+        self.after_id = 0
+        self.history = []
+        self.page = []
+        self.index = 0
+        self.image = 0
+
+    async def load(self, after_id):
+        self.page = await db.get_pending_submissions(self.guild_id, after_id)
+        self.after_id = after_id
+        self.index = min(self.index, max(len(self.page) - 1, 0))
+        self.image = 0
+
+    async def refresh(self):
+        # Reviewed rows drop out of the page; later ones slide in.
+        await self.load(self.after_id)
+        if not self.page and self.history:
+            self.index = 0
+            await self.load(self.history.pop())
+
+    def current(self):
+        return self.page[self.index] if self.page else None
+
+    def embed(self, attached=False):
+        """Embed for the current submission; ``attached`` shows the uploaded thumbnail instead of the CDN URL."""
+        submission = self.current()
+        if submission is None:
+            return discord.Embed(title="✅ No pending submissions left.", color=discord.Color.teal())
+        sub_id, user_id, username, score, img1_url, img2_url, timestamp, _, _, proof_flag = submission
+        embed = discord.Embed(
+            title=f"📝 Submission Review – #{sub_id}",
+            description=(
+                f"**Username**: `{username}`\n"
+                f"**User ID**: `{user_id}`\n"
+                f"**Score**: `{score}`\n"
+                f"**Submitted at**: {timestamp}"
+            ),
+            color=discord.Color.teal()
+        )
+        if proof_flag:
+            embed.add_field(name="⚠️ Possible reused proof", value=proof_flag[:1024], inline=False)
+        if attached:
+            embed.set_image(url=f"attachment://{PROOF_FILENAME}")
+        else:
+            embed.set_image(url=(img1_url, img2_url)[self.image])
+        embed.set_footer(text=f"Submission ID: {sub_id} • {self.index + 1}/{len(self.page)} on this page • image {self.image + 1}/2")
+        return embed
+
+    def render(self):
+        """Return (embed, thumbnail file or None) for the current submission.
+
+        The cached thumbnail is served so paging never waits on (possibly
+        expired) CDN URLs, falling back to the URL if it was evicted. The
+        file is opened once and the embed matches whether that worked.
+        """
+        submission = self.current()
+        proof = None
+        if submission is not None:
+            path = self.client.proofs.thumbnail(submission[7 + self.image])
+            if path:
+                try:
+                    proof = discord.File(path, filename=PROOF_FILENAME)
+                except OSError:
+                    pass  # Evicted since the lookup.
+        return self.embed(proof is not None), proof
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.reviewer.id
+
+    async def redraw(self, interaction, note=None):
+        if not self.page:
+            self.stop()
+        embed, proof = self.render()
+        await interaction.response.edit_message(
+            content=note,
+            embed=embed,
+            attachments=[proof] if proof else [],
+            view=self if self.page else None
+        )
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary, row=0)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.index > 0:
+            self.index -= 1
+        elif self.history:
+            await self.load(self.history.pop())
+            self.index = len(self.page) - 1
+        self.image = 0
+        await self.redraw(interaction)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary, row=0)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        note = None
+        if self.index < len(self.page) - 1:
+            self.index += 1
+        else:
+            following = await db.get_pending_submissions(self.guild_id, self.page[-1][0])
+            if following:
+                self.history.append(self.after_id)
+                self.after_id = self.page[-1][0]
+                self.page = following
+                self.index = 0
+            else:
+                note = "You're at the end of the queue."
+        self.image = 0
+        await self.redraw(interaction, note)
+
+    @discord.ui.button(label="Other image", style=discord.ButtonStyle.secondary, row=0)
+    async def swap_image(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.image = 1 - self.image
+        await self.redraw(interaction)
+
+    @discord.ui.button(label="Approve", style=discord.ButtonStyle.green, row=1)
+    async def approve(self, interaction: discord.Interaction, button: discord.ui.Button):
+        sub_id, user_id = self.current()[:2]
+        if await db.approve_submission(sub_id, interaction.user.id):
+            self.client.notifier.send(user_id, "✅ Your submission has been approved!")
+            note = f"✅ Submission #{sub_id} approved."
+        else:
+            note = f"ℹ️ Submission #{sub_id} was already reviewed."
+        await self.refresh()
+        await self.redraw(interaction, note)
+
+    @discord.ui.button(label="Reject", style=discord.ButtonStyle.red, row=1)
+    async def reject(self, interaction: discord.Interaction, button: discord.ui.Button):
+        sub_id, user_id = self.current()[:2]
+        if await db.reject_submission(sub_id, interaction.user.id):
+            self.client.notifier.send(user_id, "❌ Your submission has been rejected.")
+            note = f"❌ Submission #{sub_id} rejected."
+        else:
+            note = f"ℹ️ Submission #{sub_id} was already reviewed."
+        await self.refresh()
+        await self.redraw(interaction, note)
+
+    @discord.ui.button(label="Approve page", style=discord.ButtonStyle.green, row=2)
+    async def approve_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        users = {sub[0]: sub[1] for sub in self.page}
+        results = await db.approve_submissions(list(users), interaction.user.id)
+        done = [sub_id for sub_id, ok in results.items() if ok]
+        for sub_id in done:
+            self.client.notifier.send(users[sub_id], "✅ Your submission has been approved!")
+        await self.refresh()
+        await self.redraw(interaction, f"✅ Approved {len(done)} submission(s).")
+
+    @discord.ui.button(label="Reject page", style=discord.ButtonStyle.red, row=2)
+    async def reject_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        users = {sub[0]: sub[1] for sub in self.page}
+        results = await db.reject_submissions(list(users), interaction.user.id)
+        done = [sub_id for sub_id, ok in results.items() if ok]
+        for sub_id in done:
+            self.client.notifier.send(users[sub_id], "❌ Your submission has been rejected.")
+        await self.refresh()
+        await self.redraw(interaction, f"❌ Rejected {len(done)} submission(s).")
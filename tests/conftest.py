@@ -0,0 +1,31 @@
+import asyncio
+import pytest
+from utils import db
+
+
+@pytest.fixture
+def run_db(tmp_path):
+    """Run ``body()`` in a fresh event loop against a fresh SQLite database."""
+    def run(body):
+        async def main():
+            await db.init_db(str(tmp_path / "test.db"))
+            try:
+                return await body()
+            finally:
+                await db.close_db()
+        return asyncio.run(main())
+    return run
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze time.monotonic; advance it with ``clock.advance(seconds)``."""
+    class Clock:
+        now = 1000.0
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    fake = Clock()
+    monkeypatch.setattr("time.monotonic", lambda: fake.now)
+    return fake
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+from utils import db
+from utils.admission import Admission
+from utils.wizard import SubmissionWizard
+
+
+def make_bot():
+    bot = SimpleNamespace()
+    bot.wizards = SubmissionWizard(bot)
+    bot.admission = Admission(bot)
+    return bot
+
+
+def test_guild_refusal_does_not_charge_the_user(run_db, clock):
+    async def body():
+        await db.set_rate_limits(1, user_rate_limit=10, guild_rate_limit=3)
+        admission = make_bot().admission
+        admitted = [await admission.check("submit", user_id, 1) for user_id in (1, 2, 3)]
+        refused = await admission.check("submit", 4, 1)
+        return admitted, refused, admission.users._buckets.peek((1, 4)).tokens
+
+    admitted, refused, tokens = run_db(body)
+    assert admitted == [0, 0, 0]
+    assert refused > 0
+    assert tokens == 10
+
+
+def test_user_refusal_does_not_charge_the_guild(run_db, clock):
+    async def body():
+        await db.set_rate_limits(1, user_rate_limit=2, guild_rate_limit=100)
+        admission = make_bot().admission
+        results = [await admission.check("submit", 7, 1) for _ in range(4)]
+        return results, admission.guilds._buckets.peek(1).tokens
+
+    results, guild_tokens = run_db(body)
+    assert results[:2] == [0, 0]
+    assert all(wait > 0 for wait in results[2:])
+    assert guild_tokens == 98
+
+
+def test_wizard_slots_are_reserved_atomically(run_db):
+    async def body():
+        await db.set_rate_limits(1, wizard_limit=2)
+        bot = make_bot()
+        users = range(10, 16)
+        prompts = await asyncio.gather(*(bot.admission.begin_wizard(user_id, 1) for user_id in users))
+        # Restarting your own wizard never needs a new slot.
+        winner = next(user_id for user_id, prompt in zip(users, prompts) if prompt is not None)
+        restarted = await bot.admission.begin_wizard(winner, 1)
+        return prompts, bot.wizards.count(1), restarted
+
+    prompts, running, restarted = run_db(body)
+    assert sum(prompt is not None for prompt in prompts) == 2
+    assert running == 2
+    assert restarted is not None
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from utils import db
+from utils.ingest import InvalidSubmission, SubmissionIngestor, SCORE_MAX
+
+
+def row(user_id, score=100, username=None, guild_id=1):
+    return (user_id, guild_id, username or f"user{user_id}", score, "https://x/1.png", "https://x/2.png")
+
+
+async def submit_all(ingestor, rows):
+    return await asyncio.gather(*(ingestor.submit(*r) for r in rows), return_exceptions=True)
+
+
+def test_bad_row_fails_alone_and_every_future_resolves(run_db):
+    async def body():
+        # A long delay makes every submission land in one group commit.
+        ingestor = SubmissionIngestor(batch_size=10, max_delay=0.2)
+        ingestor.start()
+        try:
+            # A list can't be bound as a column value, so that row's INSERT
+            # raises and rolls back the whole batch transaction.
+            results = await asyncio.wait_for(
+                submit_all(ingestor, [row(1), row(2, username=["not", "text"]), row(3), row(1, score=5)]), 5
+            )
+        finally:
+            await ingestor.stop()
+        return results, await db.get_pending_submissions(1, limit=10)
+
+    results, pending = run_db(body)
+    assert results[0] is True
+    assert isinstance(results[1], Exception)
+    assert results[2] is True
+    assert results[3] is False  # Second pending submission for the same guild.
+    assert [(user_id, score) for _, user_id, _, score, *_ in pending] == [(1, 100), (3, 100)]
+
+
+def test_out_of_range_scores_are_refused_before_queueing(run_db):
+    async def body():
+        ingestor = SubmissionIngestor()
+        ingestor.start()
+        try:
+            with pytest.raises(InvalidSubmission):
+                await ingestor.submit(*row(1, score=SCORE_MAX + 1))
+            assert ingestor.queue.empty()
+            return await ingestor.submit(*row(1, score=SCORE_MAX))
+        finally:
+            await ingestor.stop()
+
+    assert run_db(body) is True
+
+
+def test_stop_commits_everything_accepted(run_db):
+    async def body():
+        ingestor = SubmissionIngestor(queue_size=2, batch_size=2, max_delay=0.01)
+        ingestor.start()
+        pending = asyncio.ensure_future(submit_all(ingestor, [row(user_id) for user_id in range(1, 8)]))
+        # Stop while the queue is full and later submitters are blocked on it.
+        while not ingestor.queue.full():
+            await asyncio.sleep(0)
+        await ingestor.stop()
+        return await pending, len(await db.get_pending_submissions(1, limit=10))
+
+    results, stored = run_db(body)
+    assert results == [True] * 7
+    assert stored == 7
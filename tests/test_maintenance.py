@@ -0,0 +1,50 @@
+import asyncio
+from utils import db
+from utils.maintenance import Maintenance, parse_hours
+
+
+def test_parse_hours_wraps_past_midnight():
+    assert parse_hours("3-5") == {3, 4, 5}
+    assert parse_hours("23-1") == {23, 0, 1}
+    assert parse_hours("7") == {7}
+
+
+def test_claim_is_once_per_day_until_released(run_db):
+    async def body():
+        return [
+            await db.claim_maintenance("2025-03-12"),
+            await db.claim_maintenance("2025-03-12"),
+            await db.release_maintenance("2025-03-12"),
+            await db.claim_maintenance("2025-03-12"),
+            await db.claim_maintenance("2025-03-11"),
+            await db.claim_maintenance("2025-03-13"),
+        ]
+
+    assert run_db(body) == [True, False, None, True, False, True]
+
+
+def test_failed_run_is_retried_in_the_same_window(run_db):
+    async def body():
+        maintenance = Maintenance(hours="0-23", interval=0.01)
+        attempts = []
+
+        async def run(now=None):
+            attempts.append(now)
+            if len(attempts) == 1:
+                raise RuntimeError("disk full")
+
+        maintenance.run = run
+        maintenance.start()
+        try:
+            for _ in range(200):
+                if len(attempts) >= 2:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+        finally:
+            await maintenance.stop()
+        return len(attempts), await db.claim_maintenance(attempts[-1].date().isoformat())
+
+    attempts, claimable = run_db(body)
+    assert attempts == 2
+    assert claimable is False
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import random
+import pytest
+from PIL import Image, ImageDraw
+from utils import db, proofs
+from utils.proofs import DUPLICATE_DISTANCE, InvalidProof, ProofCache, dhash
+
+
+def screenshot(seed, size=(1280, 720)):
+    """A deterministic stand-in for a game screenshot: blocks of flat colour."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        box = (x, y, x + rng.randrange(40, 400), y + rng.randrange(40, 300))
+        draw.rectangle(box, fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return image
+
+
+def encode(image, fmt="PNG", **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ProofCache(root=str(tmp_path / "proofs"))
+
+
+def test_dhash_survives_recompression_and_rescaling():
+    original = screenshot(1)
+    recompressed = Image.open(io.BytesIO(encode(original, "JPEG", quality=40)))
+    rescaled = original.resize((640, 360), Image.BILINEAR)
+    assert distance(dhash(original), dhash(recompressed)) <= DUPLICATE_DISTANCE
+    assert distance(dhash(original), dhash(rescaled)) <= DUPLICATE_DISTANCE
+    assert distance(dhash(original), dhash(screenshot(2))) > DUPLICATE_DISTANCE
+
+
+def test_store_matches_a_reencoded_copy(cache):
+    image = screenshot(3)
+    png = cache._store(encode(image))
+    jpeg = cache._store(encode(image, "JPEG", quality=50))
+    assert png.sha256 != jpeg.sha256
+    assert distance(png.phash, jpeg.phash) <= DUPLICATE_DISTANCE
+    assert cache.thumbnail(png.sha256) == png.thumbnail
+    with Image.open(png.thumbnail) as thumb:
+        assert max(thumb.size) <= max(proofs.THUMBNAIL_SIZE)
+
+
+def test_similar_proofs_found_by_band_lookup(tmp_path):
+    async def run():
+        await db.init_db(str(tmp_path / "proofs.db"))
+        try:
+            stored = dhash(screenshot(4))
+            await db.record_proof_hashes(1, 10, [("a" * 64, stored)])
+            # One flipped bit in each of PHASH_BANDS - 1 bands leaves a
+            # single band intact, which the lookup must still find.
+            near = stored
+            for band in range(db.PHASH_BANDS - 1):
+                near ^= 1 << (band * 64 // db.PHASH_BANDS)
+            return (
+                await db.find_similar_proofs(1, stored, DUPLICATE_DISTANCE),
+                await db.find_similar_proofs(1, near, db.PHASH_BANDS - 1),
+                await db.find_similar_proofs(2, stored, DUPLICATE_DISTANCE),
+                await db.find_similar_proofs(1, ~stored & ((1 << 64) - 1), 64),
+            )
+        finally:
+            await db.close_db()
+
+    exact, near, other_guild, inverted = asyncio.run(run())
+    assert exact == [(10, 0)]
+    assert near == [(10, db.PHASH_BANDS - 1)]
+    assert other_guild == []
+    assert inverted == []
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image", encode(screenshot(5))[:200]])
+def test_non_images_are_rejected(cache, data):
+    with pytest.raises(InvalidProof):
+        cache._store(data)
+
+
+def test_oversized_images_are_rejected(cache, monkeypatch):
+    data = encode(Image.new("RGB", (400, 300)))
+    monkeypatch.setattr(proofs, "MAX_PROOF_PIXELS", 100_000)
+    with pytest.raises(InvalidProof):
+        cache._store(data)
+    # Pillow refuses outright past twice its own limit.
+    monkeypatch.setattr(proofs, "MAX_PROOF_PIXELS", 10 ** 9)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 50_000)
+    with pytest.raises(InvalidProof):
+        cache._store(data)
+    assert cache.size == 0
+
+
+def test_cache_write_errors_are_not_reported_as_bad_images(tmp_path):
+    # A file where the cache directory should be makes every write fail.
+    blocked = tmp_path / "proofs"
+    blocked.write_text("")
+    with pytest.raises(OSError) as raised:
+        ProofCache(root=str(blocked))._store(encode(screenshot(6)))
+    assert not isinstance(raised.value, InvalidProof)
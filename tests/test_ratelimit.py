@@ -0,0 +1,61 @@
+import pytest
+from utils.ratelimit import KeyedBuckets, PriorityBucket, TokenBucket
+
+
+def test_token_bucket_bursts_then_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    assert all(bucket.try_acquire() for _ in range(4))
+    assert not bucket.try_acquire()
+    assert bucket.retry_after() == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert bucket.try_acquire()
+    clock.advance(60)
+    assert bucket.retry_after(4) == 0
+    assert bucket.tokens == 4
+
+
+def test_keyed_buckets_retry_after_does_not_consume(clock):
+    buckets = KeyedBuckets()
+    for _ in range(5):
+        assert buckets.retry_after("a", 1, 3, 3) == 0
+    assert buckets.try_acquire("a", 1, 3, 3) == 0
+    assert buckets.retry_after("a", 1, 3) == pytest.approx(1)
+    assert buckets.try_acquire("a", 1, 3) == pytest.approx(1)
+
+
+def test_keyed_buckets_are_independent_per_key(clock):
+    buckets = KeyedBuckets()
+    assert buckets.try_acquire("a", 1, 1) == 0
+    assert buckets.try_acquire("a", 1, 1) > 0
+    assert buckets.try_acquire("b", 1, 1) == 0
+    assert len(buckets) == 2
+
+
+def test_keyed_buckets_apply_new_limits_at_once(clock):
+    buckets = KeyedBuckets()
+    assert buckets.try_acquire("a", 1, 1) == 0
+    assert buckets.try_acquire("a", 1, 1) > 0
+    assert buckets.try_acquire("a", 10, 10) == 0
+
+
+def test_keyed_buckets_cap_cost_at_capacity(clock):
+    # A command costing more than the whole burst must still be admissible.
+    buckets = KeyedBuckets()
+    assert buckets.try_acquire("a", 1, 2, tokens=5) == 0
+    assert buckets.retry_after("a", 1, 2, tokens=5) == pytest.approx(2)
+
+
+def test_priority_bucket_spend_never_waits_but_leaves_debt(clock):
+    bucket = PriorityBucket(rate=10, reserve=2)
+    for _ in range(25):
+        bucket.spend()
+    assert bucket.tokens == -10  # Debt is capped at one bucketful.
+    assert not bucket.try_acquire()
+    clock.advance(1.2)
+    assert not bucket.try_acquire()  # 2 tokens: still inside the reserve.
+    clock.advance(0.1)
+    assert bucket.try_acquire()
+
+
+def test_priority_bucket_reserve_stays_below_capacity():
+    assert PriorityBucket(rate=5, reserve=50).reserve == 4
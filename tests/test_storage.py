@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from utils import db, storage
+from utils.storage import to_postgres
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT score FROM leaderboard WHERE guild_id=? AND user_id=?",
+     "SELECT score FROM leaderboard WHERE guild_id=$1 AND user_id=$2"),
+    ("  UPDATE settings SET wizard_limit=NULLIF(wizard_limit, ?) WHERE guild_id=?\n",
+     "UPDATE settings SET wizard_limit=NULLIF(wizard_limit, $1) WHERE guild_id=$2"),
+    ("SELECT 1", "SELECT 1"),
+    ("INSERT OR IGNORE INTO owners (guild_id, user_id) VALUES (?, ?)",
+     "INSERT INTO owners (guild_id, user_id) VALUES ($1, $2) ON CONFLICT DO NOTHING"),
+    ("insert  or  ignore into reviewers (guild_id, user_id) values (?, ?)",
+     "INSERT INTO reviewers (guild_id, user_id) values ($1, $2) ON CONFLICT DO NOTHING"),
+    # Upserts already speak both dialects.
+    ("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+     "INSERT INTO meta (key, value) VALUES ($1, $2) ON CONFLICT(key) DO UPDATE SET value=excluded.value"),
+])
+def test_statements(sql, expected):
+    assert to_postgres(sql) == expected
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY AUTOINCREMENT, n INTEGER, created REAL, name TEXT)",
+     "CREATE TABLE IF NOT EXISTS t (id BIGSERIAL PRIMARY KEY, n BIGINT, created DOUBLE PRECISION, name TEXT)"),
+    ("CREATE TABLE t (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID",
+     "CREATE TABLE t (key TEXT PRIMARY KEY, value TEXT)"),
+    ("ALTER TABLE settings ADD COLUMN wizard_limit INTEGER",
+     "ALTER TABLE settings ADD COLUMN wizard_limit BIGINT"),
+    # Column types are only rewritten in DDL.
+    ("SELECT CAST(score AS INTEGER) FROM leaderboard", "SELECT CAST(score AS INTEGER) FROM leaderboard"),
+    ("CREATE INDEX IF NOT EXISTS idx ON leaderboard (guild_id, score DESC)",
+     "CREATE INDEX IF NOT EXISTS idx ON leaderboard (guild_id, score DESC)"),
+])
+def test_ddl_types(sql, expected):
+    assert to_postgres(sql) == expected
+
+
+@pytest.mark.parametrize("steps", db.MIGRATIONS[db.POSTGRES_BASELINE:])
+def test_postgres_migrations_leave_no_sqlite_syntax(steps):
+    for step in steps:
+        converted = to_postgres(step)
+        assert "?" not in converted
+        assert "AUTOINCREMENT" not in converted.upper()
+        assert "OR IGNORE" not in converted.upper()
+        if converted.upper().startswith(("CREATE TABLE", "ALTER TABLE")):
+            assert " INTEGER" not in converted.upper()
+
+
+@pytest.mark.parametrize("status, rowcount", [("INSERT 0 3", 3), ("DELETE 0", 0), ("UPDATE 12", 12), ("BEGIN", -1), (None, -1)])
+def test_rowcount_from_command_tag(status, rowcount):
+    assert storage._rowcount(status) == rowcount
+
+
+def test_open_pool_picks_the_backend_from_the_target():
+    assert isinstance(storage.open_pool("postgresql://localhost/db"), storage.PostgresPool)
+    assert isinstance(storage.open_pool("postgres://localhost/db"), storage.PostgresPool)
+    assert isinstance(storage.open_pool("data/data.db"), storage.SQLitePool)
+
+
+def test_connection_pool_is_abstract():
+    with pytest.raises(TypeError):
+        storage.ConnectionPool("data/data.db")
+
+
+def test_sqlite_notifications_survive_a_failing_callback(run_db, monkeypatch):
+    monkeypatch.setattr(storage, "NOTIFY_POLL_INTERVAL", 0.01)
+    received = []
+
+    def callback(payload):
+        received.append(payload)
+        if payload == "bad":
+            raise RuntimeError("subscriber bug")
+
+    async def body():
+        pool = db._get_pool()
+        await pool.subscribe(callback)
+        try:
+            await pool.publish(["bad"])
+            await asyncio.sleep(0.1)
+            await pool.publish(["good"])
+            await asyncio.sleep(0.1)
+            poller = pool._poller
+        finally:
+            await pool.unsubscribe()
+        return poller
+
+    poller = run_db(body)
+    assert received == ["bad", "good"]
+    # unsubscribe waits for the cancelled poller to finish.
+    assert poller.cancelled()
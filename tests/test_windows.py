@@ -0,0 +1,58 @@
+from datetime import datetime
+import pytest
+from utils import windows
+
+SEASONS = {"season_start": "2025-01-01", "season_days": 30}
+
+
+@pytest.mark.parametrize("window, when, config, expected", [
+    # Daily periods start at reset_hour UTC.
+    ("daily", "2025-03-12T00:00:00", None, "2025-03-12"),
+    ("daily", "2025-03-12T23:59:59", None, "2025-03-12"),
+    ("daily", "2025-03-12T04:59:59", {"reset_hour": 5}, "2025-03-11"),
+    ("daily", "2025-03-12T05:00:00", {"reset_hour": 5}, "2025-03-12"),
+    ("daily", "2025-03-01T02:00:00", {"reset_hour": 3}, "2025-02-28"),
+    # 2025-03-12 is a Wednesday.
+    ("weekly", "2025-03-12T12:00:00", None, "2025-03-10"),
+    ("weekly", "2025-03-10T00:00:00", None, "2025-03-10"),
+    ("weekly", "2025-03-09T23:59:59", None, "2025-03-03"),
+    ("weekly", "2025-03-12T12:00:00", {"week_start": 2}, "2025-03-12"),
+    ("weekly", "2025-03-12T12:00:00", {"week_start": 3}, "2025-03-06"),
+    ("weekly", "2025-03-12T12:00:00", {"week_start": 6}, "2025-03-09"),
+    ("weekly", "2025-03-10T01:00:00", {"reset_hour": 2}, "2025-03-03"),
+    ("weekly", "2025-01-01T12:00:00", None, "2024-12-30"),
+    # Months, including the reset hour pushing into the previous month and year.
+    ("monthly", "2025-03-31T23:00:00", None, "2025-03-01"),
+    ("monthly", "2025-03-01T01:00:00", {"reset_hour": 2}, "2025-02-01"),
+    ("monthly", "2025-01-01T00:30:00", {"reset_hour": 1}, "2024-12-01"),
+    # Seasons count from season_start in season_days steps.
+    ("season", "2025-01-01T00:00:00", SEASONS, "2025-01-01"),
+    ("season", "2025-01-30T23:59:59", SEASONS, "2025-01-01"),
+    ("season", "2025-01-31T00:00:00", SEASONS, "2025-01-31"),
+    ("season", "2025-03-12T12:00:00", SEASONS, "2025-03-02"),
+    ("season", "2025-01-31T00:30:00", {**SEASONS, "reset_hour": 1}, "2025-01-01"),
+    ("season", "2025-03-12T12:00:00", {"season_start": "2025-01-01"}, "2025-01-01"),
+    # No season configured, or before the first one.
+    ("season", "2025-03-12T12:00:00", None, None),
+    ("season", "2025-03-12T12:00:00", {"season_start": None, "season_days": 30}, None),
+    ("season", "2024-12-31T23:59:59", SEASONS, None),
+    ("all", "2025-03-12T12:00:00", SEASONS, None),
+])
+def test_bucket(window, when, config, expected):
+    assert windows.bucket(window, when, config) == expected
+
+
+def test_bucket_accepts_datetimes_and_ignores_unset_settings():
+    config = {"reset_hour": None, "week_start": None, "submission_limit": 5}
+    assert windows.bucket("weekly", datetime(2025, 3, 12, 12), config) == "2025-03-10"
+
+
+def test_buckets_lists_every_rolled_up_window():
+    assert windows.buckets("2025-03-12T12:00:00", SEASONS) == [
+        ("daily", "2025-03-12"), ("weekly", "2025-03-10"), ("monthly", "2025-03-01"), ("season", "2025-03-02"),
+    ]
+    assert [window for window, _ in windows.buckets("2025-03-12T12:00:00")] == ["daily", "weekly", "monthly"]
+
+
+def test_with_defaults_fills_missing_settings():
+    assert windows.with_defaults({"week_start": 4, "season_days": None}) == {**windows.DEFAULT_CONFIG, "week_start": 4}
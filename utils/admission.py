@@ -0,0 +1,92 @@
+import os
+from utils import db, metrics
+from utils.ratelimit import KeyedBuckets, PriorityBucket
+
+# Defaults for guilds without their own settings (see /setlimits); 0 means
+# no limit. Rates are commands per minute and also the burst size.
+USER_RATE_LIMIT = int(os.getenv("USER_RATE_LIMIT", "10"))
+GUILD_RATE_LIMIT = int(os.getenv("GUILD_RATE_LIMIT", "120"))
+WIZARD_LIMIT = int(os.getenv("WIZARD_LIMIT", "25"))
+# Discord allows about 50 requests per second per bot across every guild.
+# Interactive replies always go out; DMs and live edits wait while fewer
+# than OUTBOUND_RESERVE tokens are left, keeping headroom for replies.
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "40"))
+OUTBOUND_RESERVE = float(os.getenv("OUTBOUND_RESERVE", "10"))
+# Tokens per command; heavier commands use up a user's budget faster.
+COSTS = {"post": 3, "export": 5}
+
+REQUESTS_REJECTED = metrics.Counter(
+    "leaderboard_requests_rejected_total", "Requests refused by admission control.", ("action", "reason")
+)
+REQUESTS_QUEUED = metrics.Counter(
+    "leaderboard_requests_queued_total", "Bulk sends that waited for outbound budget.", ("kind",)
+)
+QUEUE_WAIT = metrics.Histogram(
+    "leaderboard_outbound_wait_seconds", "Time bulk sends waited for outbound budget.", ("kind",)
+)
+
+
+def _limit(value, default):
+    return default if value is None else value
+
+
+class Admission:
+    """Per-user and per-guild command limits, the wizard cap, and outbound pacing.
+
+    ``check`` charges a command to its (guild, user) and guild token
+    buckets, with limits read from the guild's cached settings; a command
+    refused by either bucket is charged to neither. Admitted
+    commands ``spend`` from the shared outbound bucket without waiting;
+    background senders ``pace`` on it and queue behind them.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.users = KeyedBuckets()
+        self.guilds = KeyedBuckets()
+        self.outbound = PriorityBucket(OUTBOUND_RATE, reserve=OUTBOUND_RESERVE)
+
+    async def limits(self, guild_id):
+        """Return (user per minute, guild per minute, concurrent wizards) for the guild."""
+        settings = await db.get_settings(guild_id) if guild_id is not None else {}
+        return (
+            _limit(settings.get("user_rate_limit"), USER_RATE_LIMIT),
+            _limit(settings.get("guild_rate_limit"), GUILD_RATE_LIMIT),
+            _limit(settings.get("wizard_limit"), WIZARD_LIMIT),
+        )
+
+    async def check(self, action, user_id, guild_id=None):
+        """Charge ``action`` to the user and guild; returns 0 if admitted, else seconds to wait."""
+        user_limit, guild_limit, _ = await self.limits(guild_id)
+        cost = COSTS.get(action, 1)
+        buckets = []
+        if user_limit:
+            buckets.append(("user", self.users, (guild_id, user_id), user_limit))
+        if guild_id is not None and guild_limit:
+            buckets.append(("guild", self.guilds, guild_id, guild_limit))
+        # Check every bucket before charging any, with no await in between,
+        # so a refusal from the guild bucket doesn't cost the user tokens.
+        for reason, keyed, key, limit in buckets:
+            wait = keyed.retry_after(key, limit / 60, limit, cost)
+            if wait:
+                REQUESTS_REJECTED.inc(action=action, reason=reason)
+                return wait
+        for _, keyed, key, limit in buckets:
+            keyed.try_acquire(key, limit / 60, limit, cost)
+        self.outbound.spend()
+        return 0.0
+
+    async def begin_wizard(self, user_id, guild_id):
+        """Start the user's /submit wizard for the guild; returns its first prompt, or None if the guild is full."""
+        _, _, limit = await self.limits(guild_id)
+        prompt = await self.bot.wizards.begin(user_id, guild_id, limit)
+        if prompt is None:
+            REQUESTS_REJECTED.inc(action="submit", reason="wizards")
+        return prompt
+
+    async def pace(self, kind):
+        """Wait for outbound budget before a background send."""
+        waited = await self.outbound.acquire()
+        if waited:
+            REQUESTS_QUEUED.inc(kind=kind)
+            QUEUE_WAIT.observe(waited, kind=kind)
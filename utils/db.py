@@ -1,170 +1,1285 @@
-import aiosqlite
+import asyncio
+import logging
 import os
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
+from utils import instrument, ranks, storage, windows
+from utils.cache import TTLCache
+
+log = logging.getLogger(__name__)
 
 DB_PATH = os.path.join("data", "data.db")
+# A SQLite file path, or a postgres:// URL to share one database between
+# shard processes on different hosts.
+DATABASE_URL = os.getenv("DATABASE_URL", DB_PATH)
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", "4096"))
+PERMISSION_CACHE_TTL = float(os.getenv("PERMISSION_CACHE_TTL", "600"))
+REVIEW_PAGE_SIZE = 5
+GUILD_CACHE_SIZE = int(os.getenv("GUILD_CACHE_SIZE", "2048"))
+GUILD_CACHE_TTL = float(os.getenv("GUILD_CACHE_TTL", "900"))
+# Passed for a numeric setting to clear the guild's own value and fall back
+# to the bot-wide default; None leaves the setting as it is.
+USE_DEFAULT = -1
 
-async def init_db():
-    os.makedirs("data", exist_ok=True)
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS submissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
+# Schema changes applied on top of the base tables, tracked with
+# PRAGMA user_version. Append new steps; never edit an applied one.
+# PostgreSQL starts from POSTGRES_SCHEMA, which matches step
+# POSTGRES_BASELINE, and runs later steps through storage.to_postgres, so
+# write those in SQL both databases accept.
+MIGRATIONS = (
+    (
+        "DELETE FROM owners WHERE rowid NOT IN (SELECT MIN(rowid) FROM owners GROUP BY guild_id, user_id)",
+        "DELETE FROM reviewers WHERE rowid NOT IN (SELECT MIN(rowid) FROM reviewers GROUP BY guild_id, user_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_owners_guild_user ON owners (guild_id, user_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_reviewers_guild_user ON reviewers (guild_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_guild_user ON submissions (guild_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_guild_score ON leaderboard (guild_id, score DESC)",
+        '''
+            CREATE TABLE IF NOT EXISTS leaderboard_best (
                 guild_id INTEGER,
+                user_id INTEGER,
                 username TEXT,
                 score INTEGER,
-                image1_url TEXT,
-                image2_url TEXT,
-                reviewed INTEGER DEFAULT 0,
-                timestamp TEXT
+                timestamp TEXT,
+                PRIMARY KEY (guild_id, user_id)
+            ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_best_rank ON leaderboard_best (guild_id, score DESC, timestamp)",
+        '''
+            INSERT INTO leaderboard_best (guild_id, user_id, username, score, timestamp)
+            SELECT guild_id, user_id, username, score, timestamp FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY guild_id, user_id ORDER BY score DESC, timestamp
+                ) AS rn
+                FROM leaderboard
+            ) WHERE rn = 1
+        ''',
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS idx_submissions_pending ON submissions (guild_id, reviewed, id)",
+    ),
+    (
+        '''
+            DELETE FROM submissions WHERE reviewed=0 AND id NOT IN (
+                SELECT MIN(id) FROM submissions WHERE reviewed=0 GROUP BY guild_id, user_id
             )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS leaderboard (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
+        ''',
+        "DROP INDEX IF EXISTS idx_submissions_guild_user",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_submissions_one_pending ON submissions (guild_id, user_id) WHERE reviewed=0",
+    ),
+    (
+        "ALTER TABLE submissions ADD COLUMN image1_sha TEXT",
+        "ALTER TABLE submissions ADD COLUMN image2_sha TEXT",
+        "ALTER TABLE submissions ADD COLUMN proof_flag TEXT",
+        '''
+            CREATE TABLE IF NOT EXISTS proof_hashes (
                 guild_id INTEGER,
+                band INTEGER,
+                value INTEGER,
+                phash INTEGER,
+                sha256 TEXT,
+                user_id INTEGER
+            )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_proof_hashes_band ON proof_hashes (guild_id, band, value)",
+    ),
+    (
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    ),
+    (
+        '''
+            CREATE TABLE IF NOT EXISTS wizards (
+                user_id INTEGER PRIMARY KEY,
+                guild_id INTEGER,
+                step TEXT,
+                data TEXT,
+                expires REAL
+            )
+        ''',
+    ),
+    (
+        "ALTER TABLE settings ADD COLUMN live_message_id INTEGER",
+    ),
+    (
+        "ALTER TABLE settings ADD COLUMN reset_hour INTEGER DEFAULT 0",
+        "ALTER TABLE settings ADD COLUMN week_start INTEGER DEFAULT 0",
+        "ALTER TABLE settings ADD COLUMN season_start TEXT",
+        "ALTER TABLE settings ADD COLUMN season_days INTEGER DEFAULT 90",
+        '''
+            CREATE TABLE IF NOT EXISTS leaderboard_windows (
+                guild_id INTEGER,
+                window TEXT,
+                bucket TEXT,
+                user_id INTEGER,
                 username TEXT,
                 score INTEGER,
-                timestamp TEXT
+                timestamp TEXT,
+                PRIMARY KEY (guild_id, window, bucket, user_id)
+            ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_windows_rank ON leaderboard_windows (guild_id, window, bucket, score DESC, timestamp)",
+        # Backfill with the default boundaries (midnight UTC, Monday weeks).
+        '''
+            INSERT INTO leaderboard_windows (guild_id, window, bucket, user_id, username, score, timestamp)
+            SELECT guild_id, window, bucket, user_id, username, score, timestamp FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY guild_id, window, bucket, user_id ORDER BY score DESC, timestamp
+                ) AS rn
+                FROM (
+                    SELECT guild_id, 'daily' AS window, date(timestamp) AS bucket, user_id, username, score, timestamp FROM leaderboard
+                    UNION ALL
+                    SELECT guild_id, 'weekly', date(timestamp, '-6 days', 'weekday 1'), user_id, username, score, timestamp FROM leaderboard
+                    UNION ALL
+                    SELECT guild_id, 'monthly', date(timestamp, 'start of month'), user_id, username, score, timestamp FROM leaderboard
+                )
+            ) WHERE rn = 1 AND bucket IS NOT NULL
+        ''',
+    ),
+    (
+        # Cross-process cache invalidations on SQLite; see storage.SQLitePool.
+        '''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT,
+                created REAL
             )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS owners (
+        ''',
+    ),
+    (
+        # Reviewed history leaves the live tables: every decision lands in
+        # review_log, and maintenance moves old or superseded leaderboard rows
+        # to leaderboard_archive. See utils.maintenance.
+        '''
+            CREATE TABLE IF NOT EXISTS review_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                submission_id INTEGER,
                 guild_id INTEGER,
-                user_id INTEGER
+                user_id INTEGER,
+                username TEXT,
+                score INTEGER,
+                submitted TEXT,
+                reviewer_id INTEGER,
+                decision TEXT,
+                reviewed_at TEXT
             )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS reviewers (
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_review_log_guild_time ON review_log (guild_id, reviewed_at)",
+        '''
+            CREATE TABLE IF NOT EXISTS leaderboard_archive (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
                 guild_id INTEGER,
-                user_id INTEGER
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                guild_id INTEGER PRIMARY KEY,
-                leaderboard_channel_id INTEGER,
-                submission_limit INTEGER DEFAULT 10
+                user_id INTEGER,
+                username TEXT,
+                score INTEGER,
+                timestamp TEXT
             )
-        ''')
-        await db.commit()
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_archive_guild_time ON leaderboard_archive (guild_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_guild_time ON leaderboard (guild_id, timestamp)",
+        "ALTER TABLE settings ADD COLUMN history_days INTEGER",
+        "ALTER TABLE settings ADD COLUMN archive_days INTEGER",
+    ),
+    (
+        # Per-guild admission limits; see utils.admission.
+        "ALTER TABLE settings ADD COLUMN user_rate_limit INTEGER",
+        "ALTER TABLE settings ADD COLUMN guild_rate_limit INTEGER",
+        "ALTER TABLE settings ADD COLUMN wizard_limit INTEGER",
+    ),
+    (
+        # Lets stream_leaderboard merge both score-ordered halves of its
+        # UNION ALL instead of sorting them in a temp B-tree.
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_archive_guild_score ON leaderboard_archive (guild_id, score DESC)",
+    ),
+)
+
+# The schema as of MIGRATIONS[:POSTGRES_BASELINE], for new PostgreSQL
+# databases. Discord ids need BIGINT, and "window" is a reserved word there.
+POSTGRES_BASELINE = 8
+POSTGRES_SCHEMA = (
+    '''
+        CREATE TABLE IF NOT EXISTS submissions (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT,
+            guild_id BIGINT,
+            username TEXT,
+            score BIGINT,
+            image1_url TEXT,
+            image2_url TEXT,
+            reviewed INTEGER DEFAULT 0,
+            timestamp TEXT,
+            image1_sha TEXT,
+            image2_sha TEXT,
+            proof_flag TEXT
+        )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_submissions_pending ON submissions (guild_id, reviewed, id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_submissions_one_pending ON submissions (guild_id, user_id) WHERE reviewed=0",
+    '''
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT,
+            guild_id BIGINT,
+            username TEXT,
+            score BIGINT,
+            timestamp TEXT
+        )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_leaderboard_guild_score ON leaderboard (guild_id, score DESC)",
+    "CREATE TABLE IF NOT EXISTS owners (guild_id BIGINT, user_id BIGINT)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_owners_guild_user ON owners (guild_id, user_id)",
+    "CREATE TABLE IF NOT EXISTS reviewers (guild_id BIGINT, user_id BIGINT)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_reviewers_guild_user ON reviewers (guild_id, user_id)",
+    '''
+        CREATE TABLE IF NOT EXISTS settings (
+            guild_id BIGINT PRIMARY KEY,
+            leaderboard_channel_id BIGINT,
+            submission_limit INTEGER DEFAULT 10,
+            live_message_id BIGINT,
+            reset_hour INTEGER DEFAULT 0,
+            week_start INTEGER DEFAULT 0,
+            season_start TEXT,
+            season_days INTEGER DEFAULT 90
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS leaderboard_best (
+            guild_id BIGINT,
+            user_id BIGINT,
+            username TEXT,
+            score BIGINT,
+            timestamp TEXT,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_leaderboard_best_rank ON leaderboard_best (guild_id, score DESC, timestamp)",
+    '''
+        CREATE TABLE IF NOT EXISTS proof_hashes (
+            guild_id BIGINT,
+            band INTEGER,
+            value BIGINT,
+            phash BIGINT,
+            sha256 TEXT,
+            user_id BIGINT
+        )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_proof_hashes_band ON proof_hashes (guild_id, band, value)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    '''
+        CREATE TABLE IF NOT EXISTS wizards (
+            user_id BIGINT PRIMARY KEY,
+            guild_id BIGINT,
+            step TEXT,
+            data TEXT,
+            expires DOUBLE PRECISION
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS leaderboard_windows (
+            guild_id BIGINT,
+            "window" TEXT,
+            bucket TEXT,
+            user_id BIGINT,
+            username TEXT,
+            score BIGINT,
+            timestamp TEXT,
+            PRIMARY KEY (guild_id, "window", bucket, user_id)
+        )
+    ''',
+    '''CREATE INDEX IF NOT EXISTS idx_leaderboard_windows_rank ON leaderboard_windows (guild_id, "window", bucket, score DESC, timestamp)''',
+)
+
+
+async def _migrate(pool, db):
+    version = await pool.user_version(db)
+    start = version
+    if version == 0 and pool.dialect == "postgres":
+        for statement in POSTGRES_SCHEMA:
+            await db.execute(statement)
+        version = POSTGRES_BASELINE
+    for number, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in steps:
+            await db.execute(statement)
+        version = number
+    if version != start:
+        await pool.set_user_version(db, version)
+        await db.execute("ANALYZE")
+
 
+_pool = None
+
+
+def _get_pool():
+    if _pool is None:
+        raise RuntimeError("Database is not initialised; call init_db() first.")
+    return _pool
+
+
+def _read():
+    return _get_pool().reader()
+
+
+def _write():
+    return _get_pool().writer()
+
+
+@instrument.query
+async def init_db(path=None):
+    """Open the pool on ``path`` (a SQLite file or postgres:// URL) and bring the schema up to date."""
+    global _pool
+    if _pool is not None:
+        return
+    path = path or DATABASE_URL
+    pool = storage.open_pool(path)
+    if pool.dialect == "sqlite":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    await pool.open()
+    try:
+        async with pool.writer() as db:
+            await pool.lock_schema(db)
+            if pool.dialect == "sqlite":
+                await _create_sqlite_tables(db)
+            await _migrate(pool, db)
+    except BaseException:
+        await pool.close()
+        raise
+    _pool = pool
+
+async def _create_sqlite_tables(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            guild_id INTEGER,
+            username TEXT,
+            score INTEGER,
+            image1_url TEXT,
+            image2_url TEXT,
+            reviewed INTEGER DEFAULT 0,
+            timestamp TEXT
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            guild_id INTEGER,
+            username TEXT,
+            score INTEGER,
+            timestamp TEXT
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS owners (
+            guild_id INTEGER,
+            user_id INTEGER
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS reviewers (
+            guild_id INTEGER,
+            user_id INTEGER
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            guild_id INTEGER PRIMARY KEY,
+            leaderboard_channel_id INTEGER,
+            submission_limit INTEGER DEFAULT 10
+        )
+    ''')
+
+@instrument.query
+async def ping(timeout=2.0):
+    """Return True if the pool is open and a reader answers within ``timeout`` seconds."""
+    if _pool is None:
+        return False
+    async def probe():
+        async with _read() as db:
+            async with db.execute("SELECT 1") as cur:
+                return await cur.fetchone() == (1,)
+    try:
+        return await asyncio.wait_for(probe(), timeout)
+    except (asyncio.TimeoutError, *_pool.errors):
+        return False
+
+def pool_stats():
+    if _pool is None:
+        return {"readers": 0, "idle_readers": 0}
+    return {"readers": _pool.size, "idle_readers": _pool.idle_readers}
+
+@instrument.query
+async def close_db():
+    global _pool
+    for cache in (permission_cache, settings_cache, leaderboard_cache):
+        cache.clear()
+    rank_index.clear()
+    await stop_cache_bus()
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+# guild_id -> (owner ids, reviewer ids). Reads fill it lazily; owner writes
+# update it in place after they commit.
+permission_cache = TTLCache(PERMISSION_CACHE_SIZE, PERMISSION_CACHE_TTL)
+# guild_id -> settings dict, and guild_id -> {limit: top-N rows}.
+settings_cache = TTLCache(GUILD_CACHE_SIZE, GUILD_CACHE_TTL)
+leaderboard_cache = TTLCache(GUILD_CACHE_SIZE, GUILD_CACHE_TTL)
+# guild_id -> every user's best all-time score in rank order. Approvals
+# update loaded guilds in place; the rest load on first use.
+rank_index = ranks.RankIndex()
+# Bumped by every write that touches a cached table. A loader that sees it
+# change while reading serves its result without caching it.
+_cache_writes = 0
+
+def _invalidate(cache, guild_id, publish=True):
+    global _cache_writes
+    _cache_writes += 1
+    cache.pop(guild_id)
+    if cache is leaderboard_cache:
+        for listener in leaderboard_listeners:
+            listener(guild_id)
+    if publish and _bus is not None:
+        _bus.publish(cache, guild_id)
+
+# Plain callables run with a guild_id whenever that guild's leaderboard
+# changes, here or (with the cache bus running) in another process. They
+# must not block; schedule any real work.
+leaderboard_listeners = []
+
+# Caches other processes must drop when this one writes, by bus name.
+SHARED_CACHES = {
+    "permissions": permission_cache,
+    "settings": settings_cache,
+    "leaderboard": leaderboard_cache,
+}
+
+class CacheBus:
+    """Carries cache invalidations between processes sharing the database.
+
+    Local writes queue (cache, guild_id) pairs and a background task
+    publishes them in batches on the pool's notification channel. Each
+    process skips its own messages and drops the named entries for the
+    rest. If the channel reports that messages may have been lost, every
+    shared cache is cleared.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.origin = uuid.uuid4().hex
+        self.published = 0
+        self.received = 0
+        self._names = {id(cache): name for name, cache in SHARED_CACHES.items()}
+        self._pending = set()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        await self.pool.subscribe(self._receive)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        try:
+            await self._flush()
+        finally:
+            await self.pool.unsubscribe()
+
+    def publish(self, cache, guild_id):
+        self._pending.add((self._names[id(cache)], guild_id))
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                await self._flush()
+            except self.pool.errors as e:
+                log.warning("cache invalidation publish failed", extra={"error": str(e)})
+                await asyncio.sleep(1)
+                self._wake.set()
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, set()
+        try:
+            await self.pool.publish([f"{self.origin}:{name}:{guild_id}" for name, guild_id in batch])
+        except BaseException:
+            self._pending |= batch
+            raise
+        self.published += len(batch)
+
+    def _receive(self, payload):
+        global _cache_writes
+        if payload is None:
+            _cache_writes += 1
+            for cache in SHARED_CACHES.values():
+                cache.clear()
+            rank_index.clear()
+            return
+        origin, name, guild_id = payload.split(":")
+        if origin == self.origin:
+            return
+        self.received += 1
+        if name == "leaderboard":
+            # Another process approved scores; reload the guild on next use.
+            rank_index.drop(int(guild_id))
+        _invalidate(SHARED_CACHES[name], int(guild_id), publish=False)
+
+_bus = None
+
+@instrument.query
+async def start_cache_bus():
+    """Share cache invalidations with other processes using the same database."""
+    global _bus
+    if _bus is None:
+        bus = CacheBus(_get_pool())
+        await bus.start()
+        _bus = bus
+
+@instrument.query
+async def stop_cache_bus():
+    global _bus
+    if _bus is not None:
+        bus, _bus = _bus, None
+        await bus.stop()
+
+async def _get_permissions(guild_id):
+    cached = permission_cache.get(guild_id)
+    if cached is not None:
+        return cached
+    writes_before = _cache_writes
+    async with _read() as db:
+        async with db.execute('''
+            SELECT 0, user_id FROM owners WHERE guild_id=?
+            UNION ALL
+            SELECT 1, user_id FROM reviewers WHERE guild_id=?
+        ''', (guild_id, guild_id)) as cur:
+            rows = await cur.fetchall()
+    perms = (
+        {user_id for kind, user_id in rows if kind == 0},
+        {user_id for kind, user_id in rows if kind == 1},
+    )
+    # A write that committed while we were reading may not be in our
+    # snapshot; serve the result but don't cache it.
+    if writes_before == _cache_writes:
+        permission_cache.set(guild_id, perms)
+    return perms
+
+def _cache_owner_change(guild_id, user_id, added):
+    global _cache_writes
+    _cache_writes += 1
+    if _bus is not None:
+        _bus.publish(permission_cache, guild_id)
+    cached = permission_cache.peek(guild_id)
+    if cached is not None:
+        if added:
+            cached[0].add(user_id)
+        else:
+            cached[0].discard(user_id)
+
+@instrument.query
 async def has_owner(guild_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT 1 FROM owners WHERE guild_id=? LIMIT 1", (guild_id,)) as cur:
-            return await cur.fetchone() is not None
+    owners, _ = await _get_permissions(guild_id)
+    return bool(owners)
 
+@instrument.query
 async def add_owner(guild_id, user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute("INSERT OR IGNORE INTO owners (guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
-        await db.commit()
+    _cache_owner_change(guild_id, user_id, added=True)
 
+@instrument.query
 async def remove_owner(guild_id, user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute("DELETE FROM owners WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-        await db.commit()
+    _cache_owner_change(guild_id, user_id, added=False)
 
+@instrument.query
 async def get_owners(guild_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT user_id FROM owners WHERE guild_id=?", (guild_id,)) as cursor:
-            return [row[0] for row in await cursor.fetchall()]
+    owners, _ = await _get_permissions(guild_id)
+    return list(owners)
 
+@instrument.query
 async def is_owner_or_reviewer(guild_id, user_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT 1 FROM owners WHERE guild_id=? AND user_id=?", (guild_id, user_id)) as cur:
-            if await cur.fetchone():
-                return True
-        async with db.execute("SELECT 1 FROM reviewers WHERE guild_id=? AND user_id=?", (guild_id, user_id)) as cur:
-            return await cur.fetchone() is not None
-
-async def add_submission(user_id, guild_id, username, score, image1, image2):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT 1 FROM submissions WHERE user_id=? AND guild_id=?", (user_id, guild_id)) as cursor:
-            if await cursor.fetchone():
-                return False
-        await db.execute('''
-            INSERT INTO submissions (user_id, guild_id, username, score, image1_url, image2_url, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, guild_id, username, score, image1, image2, datetime.utcnow().isoformat()))
-        await db.commit()
-        return True
-
-async def get_pending_submissions(guild_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT * FROM submissions WHERE guild_id=? AND reviewed=0", (guild_id,)) as cursor:
+    owners, reviewers = await _get_permissions(guild_id)
+    return user_id in owners or user_id in reviewers
+
+@instrument.query
+async def add_submission(user_id, guild_id, username, score, image1, image2, image1_sha=None, image2_sha=None, proof_flag=None):
+    return (await add_submissions([(user_id, guild_id, username, score, image1, image2, image1_sha, image2_sha, proof_flag)]))[0]
+
+@instrument.query
+async def add_submissions(submissions):
+    """Insert (user_id, guild_id, username, score, image1, image2, image1_sha,
+    image2_sha, proof_flag) rows in one transaction.
+
+    Returns one bool per row; False means the user already has a pending
+    submission for that guild (enforced by idx_submissions_one_pending).
+    """
+    timestamp = datetime.utcnow().isoformat()
+    results = []
+    async with _write() as db:
+        for submission in submissions:
+            cursor = await db.execute('''
+                INSERT OR IGNORE INTO submissions (
+                    user_id, guild_id, username, score, image1_url, image2_url, image1_sha, image2_sha, proof_flag, timestamp
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (*submission, timestamp))
+            results.append(cursor.rowcount > 0)
+    return results
+
+@instrument.query
+async def get_pending_submissions(guild_id, after_id=0, limit=REVIEW_PAGE_SIZE):
+    """Return up to ``limit`` pending submissions with id > after_id, oldest first.
+
+    Rows are (id, user_id, username, score, image1_url, image2_url, timestamp,
+    image1_sha, image2_sha, proof_flag).
+    """
+    async with _read() as db:
+        async with db.execute('''
+            SELECT id, user_id, username, score, image1_url, image2_url, timestamp, image1_sha, image2_sha, proof_flag
+            FROM submissions
+            WHERE guild_id=? AND reviewed=0 AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (guild_id, after_id, limit)) as cursor:
             return await cursor.fetchall()
 
-async def approve_submission(submission_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Get data first
-        async with db.execute("SELECT user_id, guild_id, username, score, timestamp FROM submissions WHERE id=?", (submission_id,)) as cursor:
-            row = await cursor.fetchone()
-        if row:
-            await db.execute('''
+# Perceptual hashes are split into PHASH_BANDS bands of 64 / PHASH_BANDS
+# bits. Two hashes that differ in fewer than PHASH_BANDS bits must agree on
+# at least one whole band, so near-duplicates are found with indexed
+# equality lookups instead of comparing against every stored hash.
+PHASH_BANDS = 8
+_BAND_BITS = 64 // PHASH_BANDS
+
+def _bands(phash):
+    mask = (1 << _BAND_BITS) - 1
+    return [(band, (phash >> (band * _BAND_BITS)) & mask) for band in range(PHASH_BANDS)]
+
+def _to_signed64(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+@instrument.query
+async def find_similar_proofs(guild_id, phash, max_distance):
+    """Return [(user_id, distance)] for stored proofs within max_distance bits, closest first."""
+    query = " UNION ".join(
+        "SELECT phash, user_id FROM proof_hashes WHERE guild_id=? AND band=? AND value=?"
+        for _ in range(PHASH_BANDS)
+    )
+    params = [p for band, value in _bands(phash) for p in (guild_id, band, value)]
+    async with _read() as db:
+        async with db.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+    best = {}
+    for stored, user_id in rows:
+        distance = bin((stored & ((1 << 64) - 1)) ^ phash).count("1")
+        if distance <= max_distance and distance < best.get(user_id, 65):
+            best[user_id] = distance
+    return sorted(best.items(), key=lambda item: item[1])
+
+@instrument.query
+async def record_proof_hashes(guild_id, user_id, proofs):
+    """Index (sha256, phash) pairs so later submissions can be checked against them."""
+    rows = [
+        (guild_id, band, value, _to_signed64(phash), sha256, user_id)
+        for sha256, phash in dict(proofs).items()
+        for band, value in _bands(phash)
+    ]
+    async with _write() as db:
+        await db.executemany(
+            "INSERT INTO proof_hashes (guild_id, band, value, phash, sha256, user_id) VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+
+# Keeps IN (...) lists under SQLite's host-parameter limit on older builds.
+BATCH_CHUNK_SIZE = 500
+
+def _chunks(ids):
+    ids = list(dict.fromkeys(ids))
+    for i in range(0, len(ids), BATCH_CHUNK_SIZE):
+        yield ids[i:i + BATCH_CHUNK_SIZE]
+
+@instrument.query
+async def approve_submission(submission_id, reviewer_id=None):
+    """Approve one submission. Returns False if it was already reviewed."""
+    return (await approve_submissions([submission_id], reviewer_id))[submission_id]
+
+@instrument.query
+async def approve_submissions(submission_ids, reviewer_id=None):
+    """Approve many submissions in one transaction; returns {id: approved}.
+
+    DELETE ... RETURNING claims each row exactly once, so an id that was
+    already approved or rejected (for example by a second reviewer clicking
+    at the same time) reports False and never reaches the leaderboard twice.
+    Each approval is recorded in review_log against ``reviewer_id``.
+    """
+    results = dict.fromkeys(submission_ids, False)
+    guilds = set()
+    approved = []
+    async with _write() as db:
+        for chunk in _chunks(submission_ids):
+            marks = ",".join("?" * len(chunk))
+            async with db.execute(f'''
+                DELETE FROM submissions WHERE id IN ({marks})
+                RETURNING id, user_id, guild_id, username, score, timestamp
+            ''', chunk) as cursor:
+                rows = sorted(await cursor.fetchall())
+            if not rows:
+                continue
+            scores = [row[1:] for row in rows]
+            await db.executemany('''
                 INSERT INTO leaderboard (user_id, guild_id, username, score, timestamp)
                 VALUES (?, ?, ?, ?, ?)
-            ''', row)
-        await db.execute("DELETE FROM submissions WHERE id=?", (submission_id,))
-        await db.commit()
+            ''', scores)
+            await _update_best(db, scores)
+            await _update_windows(db, scores)
+            await _log_reviews(db, rows, reviewer_id, "approved")
+            approved.extend(scores)
+            for row in rows:
+                results[row[0]] = True
+                guilds.add(row[2])
+    rank_index.apply(approved)
+    for guild_id in guilds:
+        _invalidate(leaderboard_cache, guild_id)
+    return results
+
+async def _log_reviews(db, rows, reviewer_id, decision):
+    # rows are (id, user_id, guild_id, username, score, timestamp) as claimed
+    # from submissions.
+    reviewed_at = datetime.utcnow().isoformat()
+    await db.executemany('''
+        INSERT INTO review_log (submission_id, guild_id, user_id, username, score, submitted, reviewer_id, decision, reviewed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (sub_id, guild_id, user_id, username, score, timestamp, reviewer_id, decision, reviewed_at)
+        for sub_id, user_id, guild_id, username, score, timestamp in rows
+    ])
+
+async def _window_config(db, guild_id):
+    async with db.execute(
+        "SELECT reset_hour, week_start, season_start, season_days FROM settings WHERE guild_id=?", (guild_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return dict(zip(("reset_hour", "week_start", "season_start", "season_days"), row)) if row else {}
+
+async def _update_windows(db, scores, only=None):
+    # Same best-per-user rule as leaderboard_best, once per window bucket
+    # the score's timestamp falls in (of those in ``only``, if given).
+    configs = {}
+    rows = []
+    for user_id, guild_id, username, score, timestamp in scores:
+        if guild_id not in configs:
+            configs[guild_id] = await _window_config(db, guild_id)
+        for window, bucket in windows.buckets(timestamp, configs[guild_id]):
+            if only is not None and (window, bucket) not in only:
+                continue
+            rows.append((guild_id, window, bucket, user_id, username, score, timestamp))
+    # Upsert in key order so concurrent writers (PostgreSQL) lock rows in
+    # the same order and cannot deadlock.
+    rows.sort(key=lambda row: row[:4])
+    await db.executemany('''
+        INSERT INTO leaderboard_windows (guild_id, "window", bucket, user_id, username, score, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(guild_id, "window", bucket, user_id) DO UPDATE SET
+            username=excluded.username,
+            score=excluded.score,
+            timestamp=excluded.timestamp
+        WHERE excluded.score > leaderboard_windows.score
+    ''', rows)
+
+async def _update_best(db, scores):
+    # scores are (user_id, guild_id, username, score, timestamp) rows. Keep
+    # only each user's highest score; a tie keeps the earlier entry.
+    await db.executemany('''
+        INSERT INTO leaderboard_best (guild_id, user_id, username, score, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET
+            username=excluded.username,
+            score=excluded.score,
+            timestamp=excluded.timestamp
+        WHERE excluded.score > leaderboard_best.score
+    ''', sorted((guild_id, user_id, username, score, timestamp) for user_id, guild_id, username, score, timestamp in scores))
 
-async def reject_submission(submission_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM submissions WHERE id=?", (submission_id,))
-        await db.commit()
+@instrument.query
+async def reject_submission(submission_id, reviewer_id=None):
+    """Reject one submission. Returns False if it was already reviewed."""
+    return (await reject_submissions([submission_id], reviewer_id))[submission_id]
 
-async def get_leaderboard(guild_id, limit=10):
-    async with aiosqlite.connect(DB_PATH) as db:
+@instrument.query
+async def reject_submissions(submission_ids, reviewer_id=None):
+    """Reject many submissions in one transaction; returns {id: rejected}."""
+    results = dict.fromkeys(submission_ids, False)
+    async with _write() as db:
+        for chunk in _chunks(submission_ids):
+            marks = ",".join("?" * len(chunk))
+            async with db.execute(f'''
+                DELETE FROM submissions WHERE id IN ({marks})
+                RETURNING id, user_id, guild_id, username, score, timestamp
+            ''', chunk) as cursor:
+                rows = sorted(await cursor.fetchall())
+            await _log_reviews(db, rows, reviewer_id, "rejected")
+            for row in rows:
+                results[row[0]] = True
+    return results
+
+@instrument.query
+async def get_leaderboard(guild_id, limit=10, window="all"):
+    """Top ``limit`` (username, score) rows, all-time or for the current ``window`` period."""
+    bucket = None
+    if window != "all":
+        bucket = windows.bucket(window, datetime.utcnow(), await get_settings(guild_id))
+        if bucket is None:
+            return []
+    # The bucket is part of the key, so cached rows roll over with the period.
+    key = (window, bucket, limit)
+    by_key = leaderboard_cache.get(guild_id)
+    if by_key is not None and key in by_key:
+        return by_key[key]
+    writes_before = _cache_writes
+    async with _read() as db:
+        if bucket is None:
+            query, params = '''
+                SELECT username, score FROM leaderboard_best
+                WHERE guild_id=?
+                ORDER BY score DESC, timestamp
+                LIMIT ?
+            ''', (guild_id, limit)
+        else:
+            query, params = '''
+                SELECT username, score FROM leaderboard_windows
+                WHERE guild_id=? AND "window"=? AND bucket=?
+                ORDER BY score DESC, timestamp
+                LIMIT ?
+            ''', (guild_id, window, bucket, limit)
+        async with db.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+    if writes_before == _cache_writes:
+        if by_key is None:
+            by_key = {}
+            leaderboard_cache.set(guild_id, by_key)
+        by_key[key] = rows
+    return rows
+
+@instrument.query
+async def stream_leaderboard(guild_id, chunk_size=1000):
+    """Yield every approved score for the guild, archived ones included, best first, in lists of up to chunk_size rows."""
+    async with _read() as db:
         async with db.execute('''
-            SELECT username, score FROM leaderboard
-            WHERE guild_id=?
+            SELECT username, score, timestamp FROM leaderboard WHERE guild_id=?
+            UNION ALL
+            SELECT username, score, timestamp FROM leaderboard_archive WHERE guild_id=?
             ORDER BY score DESC
-            LIMIT ?
-        ''', (guild_id, limit)) as cursor:
-            return await cursor.fetchall()
+        ''', (guild_id, guild_id)) as cursor:
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+RANK_LOAD_CHUNK = 5000
+
+@instrument.query
+async def load_rank_index(keep=None):
+    """Build the rank index from leaderboard_best, for guilds where ``keep(guild_id)`` is true."""
+    token = rank_index.begin()
+    built = {}
+    try:
+        async with _read() as db:
+            async with db.execute('''
+                SELECT guild_id, user_id, username, score, timestamp FROM leaderboard_best
+                ORDER BY guild_id
+            ''') as cursor:
+                while True:
+                    rows = await cursor.fetchmany(RANK_LOAD_CHUNK)
+                    if not rows:
+                        break
+                    for guild_id, *row in rows:
+                        if keep is None or keep(guild_id):
+                            built.setdefault(guild_id, []).append(row)
+    except BaseException:
+        rank_index.abandon(token)
+        raise
+    built = rank_index.finish(token, {guild_id: ranks.GuildRanks(rows) for guild_id, rows in built.items()})
+    return sum(map(len, built.values()))
+
+async def _guild_ranks(guild_id):
+    ranked = rank_index.get(guild_id)
+    if ranked is not None:
+        return ranked
+    token = rank_index.begin()
+    try:
+        async with _read() as db:
+            async with db.execute(
+                "SELECT user_id, username, score, timestamp FROM leaderboard_best WHERE guild_id=?", (guild_id,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+    except BaseException:
+        rank_index.abandon(token)
+        raise
+    built = rank_index.finish(token, {guild_id: ranks.GuildRanks(rows)})
+    ranked = rank_index.get(guild_id)
+    # finish() skips the guild if another process changed it mid-read; the
+    # rows are still as fresh as any query, so serve them uncached.
+    return ranked if ranked is not None else built.get(guild_id, ranks.GuildRanks(rows))
+
+@instrument.query
+async def get_user_rank(guild_id, user_id):
+    """Return (rank, score, ranked players) for the user's best score, or None if unranked."""
+    ranked = await _guild_ranks(guild_id)
+    rank = ranked.rank(user_id)
+    if rank is None:
+        return None
+    return rank, ranked.score(user_id), len(ranked)
 
+@instrument.query
+async def get_rank_range(guild_id, start, count):
+    """Return (ranked players, rows): (rank, user_id, username, score) for ranks start+1..start+count."""
+    ranked = await _guild_ranks(guild_id)
+    return len(ranked), ranked.entries(start, start + count)
+
+@instrument.query
+async def get_rank_around(guild_id, user_id, radius=2):
+    """(rank, user_id, username, score) rows for up to ``radius`` players either side of the user."""
+    return (await _guild_ranks(guild_id)).around(user_id, radius)
+
+@instrument.query
 async def set_leaderboard_channel(guild_id, channel_id):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute("""
             INSERT INTO settings (guild_id, leaderboard_channel_id)
             VALUES (?, ?)
             ON CONFLICT(guild_id) DO UPDATE SET leaderboard_channel_id=excluded.leaderboard_channel_id
         """, (guild_id, channel_id))
-        await db.commit()
+    _invalidate(settings_cache, guild_id)
 
+@instrument.query
 async def set_submission_limit(guild_id, limit):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute("""
             INSERT INTO settings (guild_id, submission_limit)
             VALUES (?, ?)
             ON CONFLICT(guild_id) DO UPDATE SET submission_limit=excluded.submission_limit
         """, (guild_id, limit))
-        await db.commit()
+    _invalidate(settings_cache, guild_id)
         
-async def auto_add_admins_as_owners(guild):
-    async with aiosqlite.connect(DB_PATH) as db:
-        owner_id = str(guild.owner_id)
-        print(owner_id)
-        await db.execute("INSERT OR IGNORE INTO owners (guild_id, user_id) VALUES (?, ?)", (guild.id, owner_id))
-        print("Added Member to admins")
-        await db.commit()
+@instrument.query
+async def set_window_config(guild_id, reset_hour=None, week_start=None, season_start=None, season_days=None, clear_season=False):
+    """Change the guild's period boundaries; None leaves a setting as it is. Returns the resulting config.
+
+    The current period of every window is rebuilt under the new boundaries,
+    so the daily/weekly boards don't read empty until the next approval.
+    Earlier periods keep the boundaries they were built with.
+    """
+    async with _write() as db:
+        await db.execute("""
+            INSERT INTO settings (guild_id, reset_hour, week_start, season_start, season_days)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+                reset_hour=COALESCE(excluded.reset_hour, settings.reset_hour),
+                week_start=COALESCE(excluded.week_start, settings.week_start),
+                season_start=COALESCE(excluded.season_start, settings.season_start),
+                season_days=COALESCE(excluded.season_days, settings.season_days)
+        """, (guild_id, reset_hour, week_start, season_start, season_days))
+        if clear_season:
+            await db.execute("UPDATE settings SET season_start=NULL WHERE guild_id=?", (guild_id,))
+        config = await _window_config(db, guild_id)
+        await _rebuild_current_windows(db, guild_id, config, datetime.utcnow())
+    _invalidate(settings_cache, guild_id)
+    _invalidate(leaderboard_cache, guild_id)
+    return windows.with_defaults(config)
+
+async def _rebuild_current_windows(db, guild_id, config, now):
+    current = set(windows.buckets(now, config))
+    since = min(date for _, date in current)
+    since = (datetime.fromisoformat(since) + timedelta(hours=windows.with_defaults(config)["reset_hour"])).isoformat()
+    await db.executemany(
+        'DELETE FROM leaderboard_windows WHERE guild_id=? AND "window"=? AND bucket=?',
+        [(guild_id, window, bucket) for window, bucket in sorted(current)]
+    )
+    # Superseded scores may have been archived but can still be a period's best.
+    async with db.execute('''
+        SELECT user_id, guild_id, username, score, timestamp FROM leaderboard WHERE guild_id=? AND timestamp >= ?
+        UNION ALL
+        SELECT user_id, guild_id, username, score, timestamp FROM leaderboard_archive WHERE guild_id=? AND timestamp >= ?
+    ''', (guild_id, since, guild_id, since)) as cursor:
+        scores = await cursor.fetchall()
+    await _update_windows(db, scores, only=current)
+
+@instrument.query
+async def set_live_message(guild_id, message_id):
+    """Remember (or with None, forget) the guild's auto-updating leaderboard message."""
+    async with _write() as db:
+        await db.execute("""
+            INSERT INTO settings (guild_id, live_message_id)
+            VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET live_message_id=excluded.live_message_id
+        """, (guild_id, message_id))
+    _invalidate(settings_cache, guild_id)
+
+@instrument.query
+async def add_guild_owners(pairs):
+    """Register (guild_id, owner_id) pairs as owners in a single transaction."""
+    pairs = [(guild_id, owner_id) for guild_id, owner_id in pairs if owner_id is not None]
+    async with _write() as db:
+        await db.executemany("INSERT OR IGNORE INTO owners (guild_id, user_id) VALUES (?, ?)", pairs)
+    for guild_id, owner_id in pairs:
+        _cache_owner_change(guild_id, owner_id, added=True)
+    return len(pairs)
 
+@instrument.query
+async def save_wizard(user_id, guild_id, step, data, expires):
+    async with _write() as db:
+        await db.execute('''
+            INSERT INTO wizards (user_id, guild_id, step, data, expires) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                guild_id=excluded.guild_id, step=excluded.step, data=excluded.data, expires=excluded.expires
+        ''', (user_id, guild_id, step, data, expires))
+
+@instrument.query
+async def delete_wizard(user_id):
+    async with _write() as db:
+        await db.execute("DELETE FROM wizards WHERE user_id=?", (user_id,))
+
+@instrument.query
+async def delete_expired_wizards(now):
+    async with _write() as db:
+        await db.execute("DELETE FROM wizards WHERE expires < ?", (now,))
+
+@instrument.query
+async def load_wizards(now):
+    """Return (user_id, guild_id, step, data, expires) for every wizard still live at ``now``."""
+    async with _read() as db:
+        async with db.execute(
+            "SELECT user_id, guild_id, step, data, expires FROM wizards WHERE expires >= ?", (now,)
+        ) as cursor:
+            return await cursor.fetchall()
+
+@instrument.query
+async def get_meta(key):
+    async with _read() as db:
+        async with db.execute("SELECT value FROM meta WHERE key=?", (key,)) as cursor:
+            row = await cursor.fetchone()
+    return row[0] if row else None
+
+@instrument.query
+async def set_meta(key, value):
+    async with _write() as db:
+        await db.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key, value)
+        )
+
+# Approved scores stay in the live leaderboard table for HISTORY_DAYS before
+# maintenance moves them to leaderboard_archive; scores beaten by the
+# user's own best move at the next run whatever their age. Archived scores
+# and review_log entries are deleted after ARCHIVE_DAYS. A guild's
+# history_days/archive_days settings override these; 0 means never.
+HISTORY_DAYS = int(os.getenv("HISTORY_DAYS", "90"))
+ARCHIVE_DAYS = int(os.getenv("ARCHIVE_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Tables maintenance deletes from, so the ones worth vacuuming and analyzing.
+MAINTAINED_TABLES = ("leaderboard", "leaderboard_archive", "review_log", "submissions", "wizards", "notifications")
+
+@instrument.query
+async def set_retention(guild_id, history_days=None, archive_days=None):
+    """Set how many days the guild's scores stay live and stay archived.
+
+    None leaves a setting as it is; USE_DEFAULT restores the bot-wide
+    default. Returns the resulting (history_days, archive_days), defaults applied.
+    """
+    async with _write() as db:
+        await db.execute("""
+            INSERT INTO settings (guild_id, history_days, archive_days)
+            VALUES (?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+                history_days=COALESCE(excluded.history_days, settings.history_days),
+                archive_days=COALESCE(excluded.archive_days, settings.archive_days)
+        """, (guild_id, history_days, archive_days))
+        async with db.execute("""
+            UPDATE settings SET history_days=NULLIF(history_days, ?), archive_days=NULLIF(archive_days, ?)
+            WHERE guild_id=?
+            RETURNING history_days, archive_days
+        """, (USE_DEFAULT, USE_DEFAULT, guild_id)) as cursor:
+            history, archive = await cursor.fetchone()
+    _invalidate(settings_cache, guild_id)
+    return HISTORY_DAYS if history is None else history, ARCHIVE_DAYS if archive is None else archive
+
+@instrument.query
+async def get_retention_policies():
+    """Return {guild_id: (history_days, archive_days)}, defaults applied, for every guild with history."""
+    async with _read() as db:
+        async with db.execute('''
+            SELECT g.guild_id, s.history_days, s.archive_days FROM (
+                SELECT DISTINCT guild_id FROM leaderboard
+                UNION SELECT DISTINCT guild_id FROM leaderboard_archive
+                UNION SELECT DISTINCT guild_id FROM review_log
+            ) AS g
+            LEFT JOIN settings s ON s.guild_id = g.guild_id
+        ''') as cursor:
+            rows = await cursor.fetchall()
+    return {
+        guild_id: (HISTORY_DAYS if history is None else history, ARCHIVE_DAYS if archive is None else archive)
+        for guild_id, history, archive in rows
+    }
+
+@instrument.query
+async def archive_leaderboard(guild_id, before, limit=ARCHIVE_BATCH_SIZE):
+    """Move up to ``limit`` of the guild's scores into leaderboard_archive; returns how many moved.
+
+    A score moves if it was approved before ``before`` (None: never by age)
+    or the user's best in leaderboard_best beats it. Call again until it
+    returns fewer than ``limit``; each batch is its own short transaction.
+    """
+    async with _write() as db:
+        async with db.execute('''
+            DELETE FROM leaderboard WHERE id IN (
+                SELECT l.id FROM leaderboard l
+                LEFT JOIN leaderboard_best b ON b.guild_id = l.guild_id AND b.user_id = l.user_id
+                WHERE l.guild_id=? AND (
+                    l.timestamp < ?
+                    OR b.score > l.score
+                    OR (b.score = l.score AND b.timestamp < l.timestamp)
+                )
+                LIMIT ?
+            )
+            RETURNING guild_id, user_id, username, score, timestamp
+        ''', (guild_id, before or "", limit)) as cursor:
+            rows = await cursor.fetchall()
+        await db.executemany('''
+            INSERT INTO leaderboard_archive (guild_id, user_id, username, score, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', sorted(rows, key=lambda row: row[4]))
+    return len(rows)
+
+@instrument.query
+async def prune_archive(guild_id, before, limit=ARCHIVE_BATCH_SIZE):
+    """Delete up to ``limit`` archived scores and review_log entries older than ``before``; returns how many."""
+    deleted = 0
+    async with _write() as db:
+        for table, column in (("leaderboard_archive", "timestamp"), ("review_log", "reviewed_at")):
+            cursor = await db.execute(f'''
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE guild_id=? AND {column} < ? LIMIT ?
+                )
+            ''', (guild_id, before, limit))
+            deleted += max(cursor.rowcount, 0)
+    return deleted
+
+@instrument.query
+async def get_stale_buckets(guild_id, before, now):
+    """[(window, bucket)] for the guild's finished periods that began before ``before`` (an ISO date).
+
+    Only the current period of each window is ever shown, and the scores
+    behind the older ones are kept in leaderboard/leaderboard_archive.
+    """
+    config = await get_settings(guild_id)
+    stale = []
+    async with _read() as db:
+        for window in windows.WINDOWS[1:]:
+            current = windows.bucket(window, now, config)
+            cutoff = before if current is None else min(current, before)
+            async with db.execute('''
+                SELECT DISTINCT bucket FROM leaderboard_windows
+                WHERE guild_id=? AND "window"=? AND bucket < ?
+            ''', (guild_id, window, cutoff)) as cursor:
+                stale.extend((window, bucket) for (bucket,) in await cursor.fetchall())
+    return stale
+
+@instrument.query
+async def delete_window_bucket(guild_id, window, bucket):
+    async with _write() as db:
+        cursor = await db.execute(
+            'DELETE FROM leaderboard_windows WHERE guild_id=? AND "window"=? AND bucket=?', (guild_id, window, bucket)
+        )
+    return max(cursor.rowcount, 0)
+
+@instrument.query
+async def claim_maintenance(day):
+    """Mark maintenance as done for ``day``; False if another run (or process) already claimed it."""
+    async with _write() as db:
+        async with db.execute('''
+            INSERT INTO meta (key, value) VALUES ('maintenance_day', ?)
+            ON CONFLICT(key) DO UPDATE SET value=excluded.value WHERE meta.value < excluded.value
+            RETURNING key
+        ''', (day,)) as cursor:
+            return await cursor.fetchone() is not None
+
+@instrument.query
+async def release_maintenance(day):
+    """Give up ``day``'s claim after a failed run so the next check in the window retries it."""
+    async with _write() as db:
+        await db.execute("DELETE FROM meta WHERE key='maintenance_day' AND value=?", (day,))
+
+@instrument.query
+async def compact(pages, full_vacuum=False):
+    """Hand up to ``pages`` free pages back to the OS (SQLite) and refresh planner statistics.
+
+    ``full_vacuum`` allows the one-off full VACUUM an SQLite file created
+    before incremental auto-vacuum needs; it holds the writer throughout.
+    """
+    await _get_pool().compact(MAINTAINED_TABLES, pages, full_vacuum)
+
+SETTINGS_COLUMNS = (
+    "leaderboard_channel_id", "submission_limit", "live_message_id", "reset_hour", "week_start", "season_start", "season_days",
+    "history_days", "archive_days", "user_rate_limit", "guild_rate_limit", "wizard_limit",
+)
+
+@instrument.query
 async def get_settings(guild_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT leaderboard_channel_id, submission_limit FROM settings WHERE guild_id=?", (guild_id,)) as cursor:
+    cached = settings_cache.get(guild_id)
+    if cached is not None:
+        return dict(cached)
+    writes_before = _cache_writes
+    async with _read() as db:
+        async with db.execute('''
+            SELECT leaderboard_channel_id, submission_limit, live_message_id, reset_hour, week_start, season_start, season_days,
+                history_days, archive_days, user_rate_limit, guild_rate_limit, wizard_limit
+            FROM settings WHERE guild_id=?
+        ''', (guild_id,)) as cursor:
             row = await cursor.fetchone()
-            if row:
-                return {"leaderboard_channel_id": row[0], "submission_limit": row[1]}
-            else:
-                return {}
+    if row:
+        settings = dict(zip(SETTINGS_COLUMNS, row))
+    else:
+        settings = {}
+    if writes_before == _cache_writes:
+        settings_cache.set(guild_id, settings)
+    return dict(settings)
 
 
+@instrument.query
 async def set_leaderboard_limit(guild_id, limit):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute("""
             INSERT INTO settings (guild_id, submission_limit)
             VALUES (?, ?)
             ON CONFLICT(guild_id) DO UPDATE SET submission_limit=excluded.submission_limit
         """, (guild_id, limit))
-        await db.commit()
+    _invalidate(settings_cache, guild_id)
+
+@instrument.query
+async def set_rate_limits(guild_id, user_rate_limit=None, guild_rate_limit=None, wizard_limit=None):
+    """Set the guild's command limits (per minute) and wizard cap.
+
+    None leaves a limit as it is; USE_DEFAULT restores the bot-wide default.
+    """
+    async with _write() as db:
+        await db.execute("""
+            INSERT INTO settings (guild_id, user_rate_limit, guild_rate_limit, wizard_limit)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+                user_rate_limit=COALESCE(excluded.user_rate_limit, settings.user_rate_limit),
+                guild_rate_limit=COALESCE(excluded.guild_rate_limit, settings.guild_rate_limit),
+                wizard_limit=COALESCE(excluded.wizard_limit, settings.wizard_limit)
+        """, (guild_id, user_rate_limit, guild_rate_limit, wizard_limit))
+        await db.execute("""
+            UPDATE settings SET
+                user_rate_limit=NULLIF(user_rate_limit, ?),
+                guild_rate_limit=NULLIF(guild_rate_limit, ?),
+                wizard_limit=NULLIF(wizard_limit, ?)
+            WHERE guild_id=?
+        """, (USE_DEFAULT, USE_DEFAULT, USE_DEFAULT, guild_id))
+    _invalidate(settings_cache, guild_id)
@@ -1,33 +1,108 @@
-import aiosqlite
+import asyncio
+import csv
+import gzip
+import json
 import os
+import tempfile
+from utils import db
 
-DB_PATH = os.path.join("data", "bot_data.db")
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
-async def export_leaderboard(guild_id: int, filetype: str = "csv") -> str:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT username, score, timestamp FROM leaderboard
-            WHERE guild_id=?
-            ORDER BY score DESC
-        """, (guild_id,)) as cursor:
-            rows = await cursor.fetchall()
+EXPORT_DIR = "data"
+CHUNK_SIZE = 1000
+FORMATS = ("csv", "txt", "jsonl") + (("parquet",) if pq is not None else ())
+COLUMNS = ("Username", "Score", "Timestamp")
 
-    if not rows:
-        return None  # No data to export
 
-    filename = f"leaderboard_{guild_id}.{filetype}"
-    filepath = os.path.join("data", filename)
-
-    if filetype == "csv":
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write("Username,Score,Timestamp\n")
-            for row in rows:
-                f.write(f"{row[0]},{row[1]},{row[2]}\n")
-    elif filetype == "txt":
-        with open(filepath, "w", encoding="utf-8") as f:
-            for i, row in enumerate(rows, start=1):
-                f.write(f"{i}. {row[0]} - Score: {row[1]} - {row[2]}\n")
-    else:
+class _TextSink:
+    def __init__(self, filetype, filepath, compress):
+        if compress:
+            self.file = gzip.open(filepath, "wt", encoding="utf-8", newline="")
+        else:
+            self.file = open(filepath, "w", encoding="utf-8", newline="", buffering=1 << 16)
+        self.filetype = filetype
+        self.rank = 0
+        if filetype == "csv":
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(COLUMNS)
+
+    def write(self, rows):
+        if self.filetype == "csv":
+            self.csv.writerows(rows)
+        elif self.filetype == "jsonl":
+            self.file.writelines(
+                json.dumps({"username": u, "score": s, "timestamp": t}, ensure_ascii=False) + "\n"
+                for u, s, t in rows
+            )
+        else:
+            start = self.rank + 1
+            self.rank += len(rows)
+            self.file.writelines(
+                f"{i}. {u} - Score: {s} - {t}\n" for i, (u, s, t) in enumerate(rows, start=start)
+            )
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetSink:
+    # Each chunk becomes its own row group, so memory is bounded by CHUNK_SIZE.
+    schema = pa.schema([("username", pa.string()), ("score", pa.int64()), ("timestamp", pa.string())]) if pa else None
+
+    def __init__(self, filepath, compress):
+        self.writer = pq.ParquetWriter(filepath, self.schema, compression="gzip" if compress else "snappy")
+
+    def write(self, rows):
+        usernames, scores, timestamps = zip(*rows)
+        self.writer.write_table(pa.table([usernames, scores, timestamps], schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+async def export_leaderboard(guild_id: int, filetype: str = "csv", compress: bool = False):
+    """Write the guild's leaderboard to a new file; returns (path, upload filename) or None.
+
+    Every export gets its own temp file, so concurrent exports for the same
+    guild never share, truncate or delete each other's file. The caller
+    removes it after uploading.
+    """
+    if filetype not in FORMATS:
         return None
 
-    return filepath
+    filename = f"leaderboard_{guild_id}.{filetype}"
+    if compress and filetype != "parquet":
+        filename += ".gz"
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, filepath = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"leaderboard_{guild_id}_", suffix=filename[filename.index("."):])
+    os.close(fd)
+
+    try:
+        if filetype == "parquet":
+            sink = await asyncio.to_thread(_ParquetSink, filepath, compress)
+        else:
+            sink = await asyncio.to_thread(_TextSink, filetype, filepath, compress)
+    except BaseException:
+        os.remove(filepath)
+        raise
+
+    written = 0
+    try:
+        async for rows in db.stream_leaderboard(guild_id, CHUNK_SIZE):
+            await asyncio.to_thread(sink.write, rows)
+            written += len(rows)
+    except BaseException:
+        await asyncio.to_thread(sink.close)
+        os.remove(filepath)
+        raise
+    await asyncio.to_thread(sink.close)
+
+    if not written:
+        os.remove(filepath)
+        return None  # No data to export
+
+    return filepath, filename
@@ -0,0 +1,129 @@
+import math
+import os
+import time
+from aiohttp import web
+from utils import db, instrument, metrics, paginator
+
+HEALTH_HOST = os.getenv("HEALTH_HOST", "0.0.0.0")
+HEALTH_PORT = int(os.getenv("PORT", "8080"))
+
+
+_CACHES = {
+    "permissions": db.permission_cache,
+    "settings": db.settings_cache,
+    "leaderboard": db.leaderboard_cache,
+    "embeds": paginator.embed_cache,
+}
+
+# The metrics registry is process-wide, so the gauges are registered once
+# here and read from whichever server is running.
+_active = None
+
+
+class HealthServer:
+    """aiohttp server on the bot's own event loop serving /health and /metrics."""
+
+    def __init__(self, bot, host=HEALTH_HOST, port=HEALTH_PORT):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.started = time.monotonic()
+        self._runner = None
+        app = web.Application()
+        app.router.add_get("/", self.home)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        if instrument.profiler.enabled:
+            app.router.add_get("/debug/slowest", self.slowest)
+        self.app = app
+
+    async def start(self):
+        global _active
+        _active = self
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        global _active
+        if _active is self:
+            _active = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def queue_depths(self):
+        return {
+            "ingest": self.bot.ingestor.queue.qsize(),
+            "notify": self.bot.notifier.queue.qsize(),
+            "outbound": self.bot.admission.outbound.waiting,
+        }
+
+    def gateway_ready(self):
+        """True while every shard's websocket is open and heartbeats are acknowledged."""
+        bot = self.bot
+        if not bot.is_ready() or bot.is_closed():
+            return False
+        shards = getattr(bot, "shards", {})
+        return all(not shard.is_closed() for shard in shards.values()) and math.isfinite(bot.latency)
+
+    async def home(self, request):
+        return web.Response(text="Bot is alive!")
+
+    async def health(self, request):
+        gateway = self.gateway_ready()
+        database = await db.ping()
+        body = {
+            "status": "ok" if gateway and database else "unavailable",
+            "gateway_connected": gateway,
+            "database": database,
+            "queues": self.queue_depths(),
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+        }
+        return web.json_response(body, status=200 if gateway and database else 503)
+
+    async def metrics(self, request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def slowest(self, request):
+        return web.Response(text=instrument.profiler.report() + "\n")
+
+
+def _gateway_latency():
+    if _active is not None and math.isfinite(_active.bot.latency):
+        yield (), _active.bot.latency
+
+
+def _queue_depth():
+    if _active is not None:
+        for name, depth in _active.queue_depths().items():
+            yield (name,), depth
+
+
+def _cache_entries():
+    for name, cache in _CACHES.items():
+        yield (name,), len(cache)
+
+
+def _cache_lookups():
+    for name, cache in _CACHES.items():
+        yield (name, "hit"), cache.hits
+        yield (name, "miss"), cache.misses
+
+
+def _pool():
+    for name, value in db.pool_stats().items():
+        yield (name,), value
+
+
+def _guilds():
+    if _active is not None:
+        yield (), len(_active.bot.guilds)
+
+
+metrics.Gauge("leaderboard_gateway_latency_seconds", "Discord gateway heartbeat latency.", _gateway_latency)
+metrics.Gauge("leaderboard_queue_depth", "Items waiting in background queues.", _queue_depth, ("queue",))
+metrics.Gauge("leaderboard_cache_entries", "Entries held per in-memory cache.", _cache_entries, ("cache",))
+metrics.CollectedCounter("leaderboard_cache_lookups_total", "Cache lookups by result since start.", _cache_lookups, ("cache", "result"))
+metrics.Gauge("leaderboard_db_pool_connections", "Pooled reader connections.", _pool, ("state",))
+metrics.Gauge("leaderboard_guilds", "Guilds the bot is in.", _guilds)
@@ -0,0 +1,117 @@
+import asyncio
+import os
+from utils import db
+
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+INGEST_MAX_DELAY = float(os.getenv("INGEST_MAX_DELAY", "0.005"))
+# Scores are stored as signed 64-bit integers on both backends.
+SCORE_MIN = -(2 ** 63)
+SCORE_MAX = 2 ** 63 - 1
+
+
+class IngestorClosed(RuntimeError):
+    pass
+
+
+class InvalidSubmission(ValueError):
+    pass
+
+
+def valid_score(score):
+    return SCORE_MIN <= score <= SCORE_MAX
+
+
+class SubmissionIngestor:
+    """Write-behind queue for new submissions with group commit.
+
+    ``submit`` waits for a free queue slot (backpressure), then for the
+    commit that contains its row, and returns add_submission's result. A
+    single writer task drains the queue, committing once per
+    ``batch_size`` rows or ``max_delay`` seconds, whichever comes first.
+    """
+
+    def __init__(self, queue_size=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE, max_delay=INGEST_MAX_DELAY):
+        self.queue = asyncio.Queue(queue_size)
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._writer = None
+        self._closed = False
+        self.batches = 0
+        self.rows = 0
+
+    def start(self):
+        if self._writer is None:
+            self._closed = False
+            self._writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Refuse new work, then let the writer commit everything accepted.
+        self._closed = True
+        if self._writer is not None:
+            await self.queue.put(None)
+            await self._writer
+            self._writer = None
+        # Submitters that were blocked on a full queue can land behind the
+        # sentinel; they were accepted, so commit them too.
+        leftover = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            await self._commit(leftover)
+
+    async def submit(self, user_id, guild_id, username, score, image1, image2, image1_sha=None, image2_sha=None, proof_flag=None):
+        if self._closed:
+            raise IngestorClosed("Submissions are not being accepted right now.")
+        if not valid_score(score):
+            raise InvalidSubmission("That score is too large.")
+        future = asyncio.get_running_loop().create_future()
+        submission = (user_id, guild_id, username, score, image1, image2, image1_sha, image2_sha, proof_flag)
+        await self.queue.put((submission, future))
+        return await future
+
+    async def _collect(self):
+        first = await self.queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                item = self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        done = False
+        while not done:
+            batch, done = await self._collect()
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch):
+        try:
+            results = await db.add_submissions([submission for submission, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad row fails the whole transaction; retry the rows
+                # alone so only the caller that sent it sees the error.
+                for item in batch:
+                    await self._commit([item])
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from utils import metrics
+
+log = logging.getLogger(__name__)
+
+PROFILE_ENABLED = os.getenv("PROFILE_INTERACTIONS", "").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_SLOWEST = int(os.getenv("PROFILE_SLOWEST", "20"))
+PROFILE_DEPTH = 12
+
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+COMMAND_SECONDS = metrics.Histogram("leaderboard_command_seconds", "Slash command handler wall time.", ("command",))
+COMMAND_DB_SECONDS = metrics.Histogram(
+    "leaderboard_command_db_seconds", "Time each slash command spent awaiting utils.db calls.", ("command",)
+)
+COMMAND_ERRORS = metrics.Counter("leaderboard_command_errors_total", "Slash command handlers that raised.", ("command",))
+DB_CALL_SECONDS = metrics.Histogram("leaderboard_db_call_seconds", "utils.db coroutine wall time.", ("call",))
+DB_CALL_ROWS = metrics.Histogram("leaderboard_db_call_rows", "Rows returned per utils.db call.", ("call",), ROW_BUCKETS)
+DB_CALL_ERRORS = metrics.Counter("leaderboard_db_call_errors_total", "utils.db calls that raised.", ("call",))
+
+
+class InteractionRecord:
+    __slots__ = ("command", "user_id", "guild_id", "started", "elapsed", "db_time", "db_calls", "rows", "samples")
+
+    def __init__(self, command, user_id=None, guild_id=None):
+        self.command = command
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.db_time = 0.0
+        self.db_calls = 0
+        self.rows = 0
+        self.samples = Counter()
+
+    def __lt__(self, other):
+        return self.elapsed < other.elapsed
+
+
+_current = contextvars.ContextVar("interaction", default=None)
+_in_query = contextvars.ContextVar("in_query", default=False)
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple, dict, set)):
+        return len(result)
+    return 1 if result not in (None, False) else 0
+
+
+def command(func):
+    """Wrap a slash command callback to record wall time, DB time and errors."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(interaction, *args, **kwargs):
+        record = InteractionRecord(
+            name, getattr(interaction.user, "id", None), getattr(interaction.guild, "id", None)
+        )
+        token = _current.set(record)
+        profiler.track(record)
+        try:
+            return await func(interaction, *args, **kwargs)
+        except Exception:
+            COMMAND_ERRORS.inc(command=name)
+            raise
+        finally:
+            _current.reset(token)
+            record.elapsed = time.perf_counter() - record.started
+            profiler.untrack(record)
+            COMMAND_SECONDS.observe(record.elapsed, command=name)
+            COMMAND_DB_SECONDS.observe(record.db_time, command=name)
+
+    return wrapper
+
+
+def _account(name, elapsed, rows, nested):
+    DB_CALL_SECONDS.observe(elapsed, call=name)
+    DB_CALL_ROWS.observe(rows, call=name)
+    record = _current.get()
+    # Helpers that delegate to other db calls (approve_submission ->
+    # approve_submissions) are only charged to the interaction once.
+    if record is not None and not nested:
+        record.db_time += elapsed
+        record.db_calls += 1
+        record.rows += rows
+
+
+def query(func):
+    """Wrap a utils.db coroutine (or async generator) to record timings and row counts."""
+    name = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def stream(*args, **kwargs):
+            start = time.perf_counter()
+            rows = 0
+            try:
+                async for chunk in func(*args, **kwargs):
+                    rows += len(chunk)
+                    yield chunk
+            except Exception:
+                DB_CALL_ERRORS.inc(call=name)
+                raise
+            finally:
+                _account(name, time.perf_counter() - start, rows, False)
+        return stream
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        rows = 0
+        token = _in_query.set(True)
+        try:
+            result = await func(*args, **kwargs)
+            rows = _row_count(result)
+            return result
+        except Exception:
+            DB_CALL_ERRORS.inc(call=name)
+            raise
+        finally:
+            _in_query.reset(token)
+            _account(name, time.perf_counter() - start, rows, token.old_value is True)
+
+    return wrapper
+
+
+class SamplingProfiler:
+    """Samples the event-loop thread's stack while slash commands are running.
+
+    Each sample is charged to the interaction whose task is currently
+    executing, and the ``keep`` slowest finished interactions are retained
+    with their collapsed stacks. Disabled unless PROFILE_INTERACTIONS is set.
+    """
+
+    def __init__(self, enabled=PROFILE_ENABLED, interval=PROFILE_INTERVAL, keep=PROFILE_SLOWEST):
+        self.enabled = enabled
+        self.interval = interval
+        self.keep = keep
+        self.slowest = []
+        self._active = {}
+        self._loop = None
+        self._thread_id = None
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    def track(self, record):
+        if not self.enabled:
+            return
+        if self._sampler is None:
+            self._loop = asyncio.get_running_loop()
+            self._thread_id = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample, name="interaction-profiler", daemon=True)
+            self._sampler.start()
+        with self._lock:
+            self._active[asyncio.current_task()] = record
+
+    def untrack(self, record):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active.pop(asyncio.current_task(), None)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, record)
+            elif record.elapsed > self.slowest[0].elapsed:
+                heapq.heapreplace(self.slowest, record)
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                record = self._active.get(asyncio.current_task(self._loop))
+                if record is None:
+                    continue
+                frame = sys._current_frames().get(self._thread_id)
+                stack = []
+                while frame is not None and len(stack) < PROFILE_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                record.samples[";".join(reversed(stack))] += 1
+
+    def report(self):
+        with self._lock:
+            records = sorted(self.slowest, reverse=True)
+        lines = []
+        for record in records:
+            lines.append(
+                f"/{record.command} {record.elapsed * 1000:.1f} ms (db {record.db_time * 1000:.1f} ms, "
+                f"{record.db_calls} calls, {record.rows} rows) guild={record.guild_id} user={record.user_id}"
+            )
+            total = sum(record.samples.values())
+            for stack, count in record.samples.most_common(5):
+                lines.append(f"    {count / total:6.1%}  {stack}")
+        return "\n".join(lines)
+
+    def dump(self):
+        if self.enabled and self.slowest:
+            log.info("slowest interactions\n%s", self.report())
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,93 @@
+import asyncio
+import discord
+import logging
+import os
+import time
+from utils import db, paginator
+from utils.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+LIVE_DEBOUNCE = float(os.getenv("LIVE_DEBOUNCE", "3"))
+# Discord allows roughly five edits per five seconds per channel; one edit
+# per guild every few seconds stays well inside that.
+LIVE_MIN_INTERVAL = float(os.getenv("LIVE_MIN_INTERVAL", "5"))
+# Discord caps an embed at 25 fields.
+LIVE_PAGE_SIZE = 25
+
+
+class LiveBoards:
+    """Keeps each guild's live leaderboard message in sync with approvals.
+
+    ``schedule`` is registered as a db leaderboard listener. Calls made
+    while an edit is pending for the guild are merged into it, edits for a
+    guild are spaced at least ``min_interval`` apart, and an edit is skipped
+    when the visible top-N rows have not changed.
+    """
+
+    def __init__(self, bot, debounce=LIVE_DEBOUNCE, min_interval=LIVE_MIN_INTERVAL):
+        self.bot = bot
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self._timers = {}
+        self._last_edit = TTLCache(10000, 3600)
+        self._last_rows = TTLCache(10000, 3600)
+        self._tasks = set()
+        self.edits = 0
+        self.skipped = 0
+
+    def start(self):
+        db.leaderboard_listeners.append(self.schedule)
+
+    async def stop(self):
+        if self.schedule in db.leaderboard_listeners:
+            db.leaderboard_listeners.remove(self.schedule)
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def schedule(self, guild_id):
+        # With shards split across processes, the guild's own shard edits it.
+        if guild_id in self._timers or not self.bot.owns_guild(guild_id):
+            return
+        delay = self.debounce
+        last = self._last_edit.peek(guild_id)
+        if last is not None:
+            delay = max(delay, last + self.min_interval - time.monotonic())
+        self._timers[guild_id] = asyncio.get_running_loop().call_later(delay, self._fire, guild_id)
+
+    def _fire(self, guild_id):
+        self._timers.pop(guild_id, None)
+        task = asyncio.create_task(self.refresh(guild_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def remember(self, guild_id, rows):
+        """Record rows that were just rendered into the live message."""
+        self._last_rows.set(guild_id, list(rows))
+        self._last_edit.set(guild_id, time.monotonic())
+
+    async def refresh(self, guild_id):
+        settings = await db.get_settings(guild_id)
+        message_id = settings.get("live_message_id")
+        channel = self.bot.get_channel(settings.get("leaderboard_channel_id") or 0)
+        if not message_id or channel is None:
+            return
+        rows = await db.get_leaderboard(guild_id, settings.get("submission_limit", 10))
+        if self._last_rows.peek(guild_id) == list(rows):
+            self.skipped += 1
+            return
+        embed = paginator.cached_leaderboard_embed(guild_id, rows, per_page=LIVE_PAGE_SIZE)
+        await self.bot.admission.pace("live_edit")
+        try:
+            await channel.get_partial_message(message_id).edit(embed=embed)
+        except discord.NotFound:
+            # The message was deleted, which is how live mode is switched off.
+            await db.set_live_message(guild_id, None)
+            return
+        except discord.HTTPException as e:
+            log.warning("live board edit failed", extra={"guild_id": guild_id, "status": e.status})
+            return
+        self.remember(guild_id, rows)
+        self.edits += 1
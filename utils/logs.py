@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Each distinct (logger, message) pair may log LOG_BURST times per LOG_INTERVAL seconds.
+LOG_BURST = int(os.getenv("LOG_BURST", "10"))
+LOG_INTERVAL = float(os.getenv("LOG_INTERVAL", "60"))
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra={...}`` keys become top-level fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops repeats of the same message template beyond ``burst`` per ``interval``.
+
+    The next record that gets through carries a ``suppressed`` count.
+    """
+
+    def __init__(self, burst=LOG_BURST, interval=LOG_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        start, count, suppressed = self._windows.get(key, (now, 0, 0))
+        if now - start >= self.interval:
+            start, count = now, 0
+        if count >= self.burst:
+            self._windows[key] = (start, count, suppressed + 1)
+            return False
+        if suppressed:
+            record.suppressed = suppressed
+        self._windows[key] = (start, count + 1, 0)
+        if len(self._windows) > 10000:
+            self._windows.clear()
+        return True
+
+
+def setup_logging(level=LOG_LEVEL):
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
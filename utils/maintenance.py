@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from utils import db, metrics
+
+log = logging.getLogger(__name__)
+
+# UTC hours in which the daily run may start, e.g. "3-5" or "23-1".
+MAINTENANCE_HOURS = os.getenv("MAINTENANCE_HOURS", "3-5")
+MAINTENANCE_CHECK_INTERVAL = 600
+# Pause between batches so approvals and commands get the writer in between.
+MAINTENANCE_PAUSE = float(os.getenv("MAINTENANCE_PAUSE", "0.05"))
+# Free pages handed back to the OS per run (SQLite incremental vacuum).
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "20000"))
+# SQLite files created before incremental auto-vacuum need one full VACUUM,
+# which blocks every write until it finishes. Runs skip it (and log) unless
+# this is set, so pick a quiet window for it.
+ALLOW_FULL_VACUUM = os.getenv("ALLOW_FULL_VACUUM", "").lower() in ("1", "true", "yes")
+
+MAINTENANCE_ROWS = metrics.Counter(
+    "leaderboard_maintenance_rows_total", "Rows archived or deleted by maintenance.", ("action",)
+)
+MAINTENANCE_SECONDS = metrics.Histogram(
+    "leaderboard_maintenance_seconds", "Maintenance run time by phase.", ("phase",), (1, 5, 30, 60, 300, 900, 3600)
+)
+
+
+def parse_hours(spec):
+    """UTC hours covered by an inclusive "start-end" range, wrapping past midnight."""
+    first, _, last = spec.partition("-")
+    first, last = int(first), int(last or first)
+    return {hour % 24 for hour in range(first, last + 1 if last >= first else last + 25)}
+
+
+class Maintenance:
+    """Keeps the live tables bounded with a daily off-peak run.
+
+    A run archives each guild's old and superseded scores, deletes archived
+    scores, review_log entries and finished window standings past the
+    guild's retention, then vacuums and analyzes. Every process checks the
+    window; db.claim_maintenance lets one of them run per day, and a run
+    that fails releases the claim so a later check in the window retries.
+    """
+
+    def __init__(self, hours=MAINTENANCE_HOURS, interval=MAINTENANCE_CHECK_INTERVAL, pause=MAINTENANCE_PAUSE):
+        self.hours = parse_hours(hours)
+        self.interval = interval
+        self.pause = pause
+        self.last_run = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        # Wait for a run in progress to unwind before the pool closes.
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = datetime.utcnow()
+            if now.hour not in self.hours:
+                continue
+            day = now.date().isoformat()
+            try:
+                if not await db.claim_maintenance(day):
+                    continue
+                try:
+                    await self.run(now)
+                except BaseException:
+                    # Failed or interrupted by shutdown: let a later check retry today.
+                    await db.release_maintenance(day)
+                    raise
+            except Exception:
+                log.exception("maintenance run failed")
+
+    async def run(self, now=None):
+        """Run every maintenance step now; returns rows affected per action."""
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        counts = dict.fromkeys(("archived", "pruned", "windows"), 0)
+        with MAINTENANCE_SECONDS.time(phase="retention"):
+            for guild_id, (history_days, archive_days) in (await db.get_retention_policies()).items():
+                before = (now - timedelta(days=history_days)).isoformat() if history_days else None
+                counts["archived"] += await self._drain(db.archive_leaderboard, guild_id, before)
+                if archive_days:
+                    counts["pruned"] += await self._drain(
+                        db.prune_archive, guild_id, (now - timedelta(days=archive_days)).isoformat()
+                    )
+                if before:
+                    for window, bucket in await db.get_stale_buckets(guild_id, before[:10], now):
+                        counts["windows"] += await db.delete_window_bucket(guild_id, window, bucket)
+                        await asyncio.sleep(self.pause)
+        for action, count in counts.items():
+            MAINTENANCE_ROWS.inc(count, action=action)
+        with MAINTENANCE_SECONDS.time(phase="compact"):
+            await db.compact(VACUUM_PAGES, ALLOW_FULL_VACUUM)
+        self.last_run = now
+        log.info("maintenance complete", extra={**counts, "ms": round((time.perf_counter() - started) * 1000, 1)})
+        return counts
+
+    async def _drain(self, step, guild_id, before):
+        total = 0
+        while True:
+            done = await step(guild_id, before, db.ARCHIVE_BATCH_SIZE)
+            total += done
+            if done < db.ARCHIVE_BATCH_SIZE:
+                return total
+            await asyncio.sleep(self.pause)
@@ -0,0 +1,119 @@
+import asyncio
+import discord
+import logging
+import os
+from utils import db
+from utils.ratelimit import TokenBucket
+
+DM_CONCURRENCY = int(os.getenv("DM_CONCURRENCY", "5"))
+DM_RATE = float(os.getenv("DM_RATE", "5"))
+COALESCE_WINDOW = float(os.getenv("NOTIFY_COALESCE_WINDOW", "5"))
+QUEUE_SIZE = 10000
+MAX_MENTIONS = 10
+
+log = logging.getLogger(__name__)
+
+
+class Notifier:
+    """Background DM sender.
+
+    Messages are queued and delivered by a single worker that fans out under a
+    semaphore and a token bucket, so callers never wait on Discord. New
+    submission alerts are grouped per guild for ``COALESCE_WINDOW`` seconds
+    and sent to each owner as one DM.
+    """
+
+    def __init__(self, client, concurrency=DM_CONCURRENCY, rate=DM_RATE, window=COALESCE_WINDOW):
+        self.client = client
+        self.window = window
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate)
+        self._pending = {}
+        self._timers = {}
+        self._inflight = set()
+        self._worker = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10):
+        for guild_id in list(self._timers):
+            self._timers.pop(guild_id).cancel()
+            await self._flush_submissions(guild_id)
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    async def _drain(self):
+        # Let coalesced flushes that already fired enqueue their DMs first.
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        await self.queue.join()
+
+    def send(self, user_id, content):
+        try:
+            self.queue.put_nowait((user_id, content))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def submission_received(self, guild_id, submitter):
+        self._pending.setdefault(guild_id, []).append(submitter.mention)
+        if guild_id not in self._timers:
+            self._timers[guild_id] = asyncio.get_running_loop().call_later(
+                self.window, self._schedule_flush, guild_id
+            )
+
+    def _schedule_flush(self, guild_id):
+        self._timers.pop(guild_id, None)
+        self._track(asyncio.create_task(self._flush_submissions(guild_id)))
+
+    async def _flush_submissions(self, guild_id):
+        mentions = self._pending.pop(guild_id, [])
+        if not mentions:
+            return
+        if len(mentions) == 1:
+            content = f"📥 New submission received from {mentions[0]} in guild ID {guild_id}."
+        else:
+            shown = ", ".join(mentions[:MAX_MENTIONS])
+            if len(mentions) > MAX_MENTIONS:
+                shown += f" and {len(mentions) - MAX_MENTIONS} more"
+            content = f"📥 {len(mentions)} new submissions received in guild ID {guild_id} from {shown}."
+        for owner_id in await db.get_owners(guild_id):
+            self.send(owner_id, content)
+
+    def _track(self, task):
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self):
+        while True:
+            user_id, content = await self.queue.get()
+            await self._semaphore.acquire()
+            await self._bucket.acquire()
+            await self.client.admission.pace("dm")
+            self._track(asyncio.create_task(self._deliver(user_id, content)))
+
+    async def _deliver(self, user_id, content):
+        try:
+            user = self.client.get_user(user_id)
+            if user is None:
+                user = await self.client.fetch_user(user_id)
+            await user.send(content)
+            self.sent += 1
+        except discord.Forbidden:
+            self.failed += 1
+            log.info("cannot DM user", extra={"user_id": user_id})
+        except discord.HTTPException as e:
+            self.failed += 1
+            log.warning("DM failed", extra={"user_id": user_id, "status": e.status, "error": str(e)})
+        finally:
+            self._semaphore.release()
+            self.queue.task_done()
@@ -1,10 +1,104 @@
 import discord
+import os
+from utils import db
+from utils.cache import TTLCache
+from utils.windows import TITLES
 
-def leaderboard_embed(data, page=0, per_page=5):
-    embed = discord.Embed(title="🏆 Leaderboard", color=discord.Color.gold())
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "900"))
+
+# (guild_id, page, per_page, window) -> (rows, embed). utils.db hands out the same
+# rows list until an approval or settings change invalidates it, so an
+# identity check on the rows is enough to tell whether the embed is stale.
+embed_cache = TTLCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL)
+
+def leaderboard_embed(data, page=0, per_page=5, window="all"):
+    embed = discord.Embed(title=TITLES.get(window, TITLES["all"]), color=discord.Color.gold())
     start = page * per_page
     end = start + per_page
     for i, entry in enumerate(data[start:end], start=start + 1):
-        embed.add_field(name=f"{i}. {entry[0]}", value=f"Score: {entry[1]}", inline=False)
-    embed.set_footer(text=f"Page {page + 1}")
+        embed.add_field(name=f"{i}. {entry[0]}", value=f"Score: **{entry[1]}**", inline=False)
+    pages = max(1, -(-len(data) // per_page))
+    if pages > 1:
+        embed.set_footer(text=f"Page {page + 1}/{pages}")
     return embed
+
+def cached_leaderboard_embed(guild_id, data, page=0, per_page=5, window="all"):
+    key = (guild_id, page, per_page, window)
+    cached = embed_cache.get(key)
+    if cached is not None and cached[0] is data:
+        return cached[1]
+    embed = leaderboard_embed(data, page, per_page, window)
+    embed_cache.set(key, (data, embed))
+    return embed
+
+RANK_PAGE_SIZE = 10
+
+def ranked_embed(rows, page, pages, highlight=None):
+    """Embed for (rank, user_id, username, score) rows, marking the ``highlight`` user."""
+    embed = discord.Embed(title=TITLES["all"], color=discord.Color.gold())
+    for rank, user_id, username, score in rows:
+        marker = "➡️ " if user_id == highlight else ""
+        embed.add_field(name=f"{marker}{rank}. {username}", value=f"Score: **{score}**", inline=False)
+    if not rows:
+        embed.description = "No approved scores yet."
+    embed.set_footer(text=f"Page {page + 1}/{pages}")
+    return embed
+
+class LeaderboardPages(discord.ui.View):
+    """All-time leaderboard browsed a page at a time from the rank index.
+
+    Each page is a rank range lookup, so any page costs the same as the
+    first and "Jump to my page" needs only the viewer's rank. ``summary``,
+    if set, is an embed kept above the page on every redraw.
+    """
+
+    def __init__(self, guild_id, viewer_id, per_page=RANK_PAGE_SIZE, summary=None):
+        super().__init__(timeout=300)
+        self.guild_id = guild_id
+        self.viewer_id = viewer_id
+        self.per_page = per_page
+        self.summary = summary
+        self.page = 0
+        self.pages = 1
+
+    async def show(self, page):
+        """Load ``page`` (clamped to the last one) and return its embed."""
+        total, rows = await db.get_rank_range(self.guild_id, page * self.per_page, self.per_page)
+        self.pages = max(1, -(-total // self.per_page))
+        if page >= self.pages:
+            page = self.pages - 1
+            total, rows = await db.get_rank_range(self.guild_id, page * self.per_page, self.per_page)
+        self.page = page
+        self.previous.disabled = page == 0
+        self.next.disabled = page >= self.pages - 1
+        return ranked_embed(rows, page, self.pages, self.viewer_id)
+
+    async def my_page(self):
+        """The page holding the viewer's rank, or None if they are unranked."""
+        standing = await db.get_user_rank(self.guild_id, self.viewer_id)
+        return None if standing is None else (standing[0] - 1) // self.per_page
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.viewer_id
+
+    async def redraw(self, interaction, page, note=None):
+        embed = await self.show(page)
+        embeds = [self.summary, embed] if self.summary is not None else [embed]
+        await interaction.response.edit_message(content=note, embeds=embeds, view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.redraw(interaction, max(self.page - 1, 0))
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.redraw(interaction, self.page + 1)
+
+    @discord.ui.button(label="Jump to my page", style=discord.ButtonStyle.primary)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        page = await self.my_page()
+        if page is None:
+            await self.redraw(interaction, self.page, "You have no approved score on this leaderboard yet.")
+        else:
+            await self.redraw(interaction, page)
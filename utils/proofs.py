@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from PIL import Image, UnidentifiedImageError
+from utils import db
+
+PROOF_DIR = os.path.join("data", "proofs")
+PROOF_CACHE_BYTES = int(os.getenv("PROOF_CACHE_BYTES", str(512 * 1024 * 1024)))
+PROOF_WORKERS = int(os.getenv("PROOF_WORKERS", "4"))
+MAX_PROOF_BYTES = 25 * 1024 * 1024
+# Decoding allocates every pixel whatever the file size, so a tiny file can
+# still ask for gigabytes; an 8K screenshot is about 33 megapixels.
+MAX_PROOF_PIXELS = 40_000_000
+THUMBNAIL_SIZE = (800, 800)
+# dHash bits that may differ for two proofs to count as the same screenshot.
+# Must stay below db.PHASH_BANDS so a band lookup is guaranteed to find it.
+DUPLICATE_DISTANCE = 6
+
+Proof = namedtuple("Proof", "sha256 phash thumbnail")
+
+
+class InvalidProof(ValueError):
+    pass
+
+
+def dhash(image):
+    """64-bit difference hash: robust to rescaling and recompression."""
+    gray = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = gray.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            bits = (bits << 1) | (left > pixels[row * 9 + col + 1])
+    return bits
+
+
+class ProofCache:
+    """Content-addressed on-disk cache of proof images and review thumbnails.
+
+    Files live at ``root/<sha[:2]>/<sha>`` with a ``.thumb.jpg`` next to
+    them, and the least recently used pairs are evicted once the cache
+    grows past ``max_bytes``. Downloads and image work run on at most
+    ``workers`` slots at a time.
+    """
+
+    def __init__(self, root=PROOF_DIR, max_bytes=PROOF_CACHE_BYTES, workers=PROOF_WORKERS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._semaphore = asyncio.Semaphore(workers)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+
+    def _paths(self, sha):
+        folder = os.path.join(self.root, sha[:2])
+        return os.path.join(folder, sha), os.path.join(folder, sha + ".thumb.jpg")
+
+    async def load(self):
+        await asyncio.to_thread(self._load)
+
+    def _load(self):
+        found = []
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".thumb.jpg"):
+                    continue
+                original, thumb = self._paths(name)
+                try:
+                    size = os.path.getsize(original) + os.path.getsize(thumb)
+                    found.append((os.path.getmtime(original), name, size))
+                except OSError:
+                    continue
+        with self._lock:
+            for _, sha, size in sorted(found):
+                self._entries[sha] = size
+                self.size += size
+            self._evict()
+
+    async def fetch(self, attachment):
+        if attachment.size > MAX_PROOF_BYTES:
+            raise InvalidProof("Proof images must be under 25 MB.")
+        async with self._semaphore:
+            data = await attachment.read()
+            return await asyncio.to_thread(self._store, data)
+
+    async def store(self, data):
+        async with self._semaphore:
+            return await asyncio.to_thread(self._store, data)
+
+    def _store(self, data):
+        sha = hashlib.sha256(data).hexdigest()
+        original, thumb = self._paths(sha)
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                if image.width * image.height > MAX_PROOF_PIXELS:
+                    raise InvalidProof("Proof images must be under 40 megapixels.")
+                # Only a thumbnail-sized image is needed, so JPEGs decode
+                # straight at 1/2 to 1/8 scale; the hash comes from it too.
+                image.draft("RGB", THUMBNAIL_SIZE)
+                preview = image.convert("RGB")
+            preview.thumbnail(THUMBNAIL_SIZE)
+            phash = dhash(preview)
+        except Image.DecompressionBombError as e:
+            raise InvalidProof("Proof images must be under 40 megapixels.") from e
+        except (UnidentifiedImageError, OSError) as e:
+            # Pillow reports truncated or corrupt image data as OSError.
+            raise InvalidProof("Proofs must be image files.") from e
+        # Failures writing the cache (disk full, permissions) aren't the
+        # submitter's fault, so they propagate as themselves.
+        if not os.path.exists(thumb):
+            os.makedirs(os.path.dirname(thumb), exist_ok=True)
+            preview.save(thumb, "JPEG", quality=85)
+        if not os.path.exists(original):
+            with open(original, "wb") as f:
+                f.write(data)
+        with self._lock:
+            if sha not in self._entries:
+                size = len(data) + os.path.getsize(thumb)
+                self._entries[sha] = size
+                self.size += size
+            self._entries.move_to_end(sha)
+            self._evict(keep=sha)
+        return Proof(sha, phash, thumb)
+
+    def thumbnail(self, sha):
+        """Return the cached thumbnail path for ``sha``, or None if it was evicted."""
+        if not sha:
+            return None
+        with self._lock:
+            if sha not in self._entries:
+                return None
+            self._entries.move_to_end(sha)
+        thumb = self._paths(sha)[1]
+        return thumb if os.path.exists(thumb) else None
+
+    def _evict(self, keep=None):
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            sha, size = next(iter(self._entries.items()))
+            if sha == keep:
+                break
+            del self._entries[sha]
+            self.size -= size
+            self.evictions += 1
+            for path in self._paths(sha):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+async def reuse_flag(guild_id, proofs):
+    """Describe earlier submissions in the guild whose proofs look like these, or return None."""
+    notes = []
+    if proofs[0].sha256 == proofs[1].sha256:
+        notes.append("both proofs are the same image")
+    for number, proof in enumerate(proofs, start=1):
+        matches = await db.find_similar_proofs(guild_id, proof.phash, DUPLICATE_DISTANCE)
+        for user_id, distance in matches[:3]:
+            kind = "identical to" if distance == 0 else "near-identical to"
+            notes.append(f"image {number} is {kind} a proof from <@{user_id}>")
+    return "; ".join(notes) or None
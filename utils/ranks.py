@@ -0,0 +1,121 @@
+from sortedcontainers import SortedList
+
+
+def percentile(rank, total):
+    """Percent of ranked players at or below ``rank`` (100 for first place)."""
+    return 100.0 * (total - rank + 1) / total if total else 0.0
+
+
+class GuildRanks:
+    """Every user's best score in one guild, kept in leaderboard order.
+
+    Keys are (-score, timestamp, user_id), so the order matches
+    leaderboard_best's ``ORDER BY score DESC, timestamp`` and rank lookups,
+    rank ranges and updates are O(log n).
+    """
+
+    __slots__ = ("order", "keys", "names")
+
+    def __init__(self, rows=()):
+        # rows are (user_id, username, score, timestamp), one per user.
+        self.keys = {user_id: (-score, timestamp, user_id) for user_id, _, score, timestamp in rows}
+        self.names = {user_id: username for user_id, username, _, _ in rows}
+        self.order = SortedList(self.keys.values())
+
+    def __len__(self):
+        return len(self.order)
+
+    def add(self, user_id, username, score, timestamp):
+        """Record a score, keeping only the user's best; an equal score keeps the earlier entry."""
+        old = self.keys.get(user_id)
+        if old is not None:
+            if score <= -old[0]:
+                return False
+            self.order.remove(old)
+        key = self.keys[user_id] = (-score, timestamp, user_id)
+        self.order.add(key)
+        self.names[user_id] = username
+        return True
+
+    def rank(self, user_id):
+        """1-based rank of the user's best score, or None if they have none."""
+        key = self.keys.get(user_id)
+        return None if key is None else self.order.bisect_left(key) + 1
+
+    def score(self, user_id):
+        key = self.keys.get(user_id)
+        return None if key is None else -key[0]
+
+    def entries(self, start, stop):
+        """(rank, user_id, username, score) for 0-based positions start..stop-1."""
+        start = max(start, 0)
+        return [
+            (rank, key[2], self.names[key[2]], -key[0])
+            for rank, key in enumerate(self.order.islice(start, stop), start=start + 1)
+        ]
+
+    def around(self, user_id, radius):
+        """Up to ``radius`` entries either side of the user, plus the user."""
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        return self.entries(rank - 1 - radius, rank + radius)
+
+
+class RankIndex:
+    """GuildRanks per guild, loaded from leaderboard_best and kept current by approvals.
+
+    A load reads a snapshot while approvals may still be committing, so
+    ``begin`` starts recording every change applied meanwhile and ``finish``
+    replays them onto the freshly built guilds before installing them.
+    """
+
+    def __init__(self):
+        self.guilds = {}
+        self._loads = {}
+
+    def get(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def apply(self, scores):
+        """Apply approved (user_id, guild_id, username, score, timestamp) rows."""
+        for user_id, guild_id, username, score, timestamp in scores:
+            ranked = self.guilds.get(guild_id)
+            if ranked is not None:
+                ranked.add(user_id, username, score, timestamp)
+        for events in self._loads.values():
+            events.extend(("add", row) for row in scores)
+
+    def drop(self, guild_id):
+        self.guilds.pop(guild_id, None)
+        for events in self._loads.values():
+            events.append(("drop", guild_id))
+
+    def clear(self):
+        self.guilds.clear()
+        for events in self._loads.values():
+            events.append(("clear", None))
+
+    def begin(self):
+        token = object()
+        self._loads[token] = []
+        return token
+
+    def finish(self, token, built):
+        """Install ``built`` ({guild_id: GuildRanks}) with changes since ``begin`` replayed."""
+        for kind, value in self._loads.pop(token):
+            if kind == "add":
+                user_id, guild_id, username, score, timestamp = value
+                if guild_id in built:
+                    built[guild_id].add(user_id, username, score, timestamp)
+            elif kind == "drop":
+                built.pop(value, None)
+            else:
+                built.clear()
+        for guild_id, ranked in built.items():
+            # A guild loaded by someone else meanwhile is already current.
+            self.guilds.setdefault(guild_id, ranked)
+        return built
+
+    def abandon(self, token):
+        self._loads.pop(token, None)
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from utils.cache import TTLCache
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, bursting up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens=1):
+        """Seconds until ``tokens`` will be available."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens=1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class KeyedBuckets:
+    """One TokenBucket per key, created on first use and forgotten once idle for ``ttl`` seconds.
+
+    Limits are passed on every call so a settings change applies at once.
+    Keep ``ttl`` longer than a bucket takes to refill, or an evicted key
+    would come back with a full bucket early.
+    """
+
+    def __init__(self, maxsize=10000, ttl=600):
+        self._buckets = TTLCache(maxsize, ttl)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _bucket(self, key, rate, capacity):
+        bucket = self._buckets.peek(key)
+        if bucket is None or bucket.rate != rate or bucket.capacity != capacity:
+            bucket = TokenBucket(rate, capacity)
+        self._buckets.set(key, bucket)
+        return bucket
+
+    def retry_after(self, key, rate, capacity, tokens=1):
+        """Seconds until ``key``'s bucket holds ``tokens``, without taking them; 0 if it does now."""
+        return self._bucket(key, rate, capacity).retry_after(min(tokens, capacity))
+
+    def try_acquire(self, key, rate, capacity, tokens=1):
+        """Take ``tokens`` from ``key``'s bucket. Returns 0 on success, else seconds to wait."""
+        bucket = self._bucket(key, rate, capacity)
+        tokens = min(tokens, capacity)
+        if bucket.try_acquire(tokens):
+            return 0.0
+        return bucket.retry_after(tokens)
+
+
+class PriorityBucket(TokenBucket):
+    """Token bucket shared by interactive replies and bulk sends.
+
+    Interactive work calls ``spend``, which never waits and may run the
+    bucket into debt. Bulk work calls ``acquire``, which waits until the
+    bucket holds more than ``reserve`` tokens, so a burst of commands
+    delays queued DMs rather than the other way round.
+    """
+
+    def __init__(self, rate, capacity=None, reserve=0):
+        super().__init__(rate, capacity)
+        self.reserve = min(reserve, self.capacity - 1)
+        self.waiting = 0
+
+    def spend(self, tokens=1):
+        self._refill()
+        self.tokens = max(self.tokens - tokens, -self.capacity)
+
+    def try_acquire(self, tokens=1):
+        self._refill()
+        if self.tokens - tokens >= self.reserve:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens=1):
+        """Wait for room above the reserve; returns the seconds spent waiting."""
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens + self.reserve - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+        return time.monotonic() - start
@@ -0,0 +1,521 @@
+"""Connection pools for the databases utils.db can run on.
+
+utils.db is written against the subset of the aiosqlite API it needs:
+``execute``/``executemany``, cursors with ``fetchone``/``fetchall``/
+``fetchmany``/``rowcount``, ``commit`` and ``rollback``. SQLitePool hands
+out aiosqlite connections as they are; PostgresPool wraps asyncpg
+connections in the same API and rewrites the SQLite dialect (``?``
+placeholders, INSERT OR IGNORE, column types in DDL) on the way through.
+Both share the reader/writer pooling and its metrics below.
+
+Pick a backend with ``open_pool(target)``: a ``postgres://`` or
+``postgresql://`` URL selects PostgreSQL (needs ``pip install asyncpg``),
+anything else is a SQLite file path.
+"""
+import abc
+import aiosqlite
+import asyncio
+import functools
+import logging
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from utils import metrics
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+log = logging.getLogger(__name__)
+
+READER_POOL_SIZE = int(os.getenv("DB_READERS", "4"))
+# SQLite allows one writer per file; PostgreSQL can commit several
+# transactions at once.
+POSTGRES_WRITERS = int(os.getenv("DB_WRITERS", "4"))
+NOTIFY_CHANNEL = "leaderboard_events"
+NOTIFY_POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_INTERVAL", "0.5"))
+NOTIFY_RETENTION = 300
+
+# Applied to every pooled SQLite connection. WAL lets the readers run
+# alongside the single writer; synchronous=NORMAL is durable enough under WAL.
+# auto_vacuum only takes effect on a new file (see SQLitePool.compact).
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+)
+
+POOL_WAIT = metrics.Histogram(
+    "leaderboard_db_pool_wait_seconds", "Time spent waiting for a pooled connection.", ("mode",)
+)
+POOL_HELD = metrics.Histogram(
+    "leaderboard_db_connection_held_seconds", "Time a pooled connection was held (query plus commit).", ("mode",)
+)
+
+
+def open_pool(target, readers=READER_POOL_SIZE):
+    if target.startswith(("postgres://", "postgresql://")):
+        return PostgresPool(target, readers)
+    return SQLitePool(target, readers)
+
+
+class ConnectionPool(abc.ABC):
+    """A fixed set of writer connections plus a fixed set of read-only ones.
+
+    Writers run one transaction each, committed when the ``writer()`` block
+    exits cleanly and rolled back otherwise. Backends supply the
+    connections, schema versioning, compaction and notifications.
+    """
+
+    dialect = None
+    # Exceptions that mean the database itself is unavailable.
+    errors = ()
+
+    def __init__(self, target, readers=READER_POOL_SIZE, writers=1):
+        self.target = target
+        self.size = max(1, readers)
+        self.writers = max(1, writers)
+        self._readers = asyncio.Queue()
+        self._writers = asyncio.Queue()
+        self._reader_connections = []
+        self._writer_connections = []
+
+    @abc.abstractmethod
+    async def _connect(self, readonly=False):
+        """Open one connection in the utils.db API."""
+
+    async def _begin(self, conn):
+        pass
+
+    async def open(self):
+        for _ in range(self.writers):
+            conn = await self._connect()
+            self._writer_connections.append(conn)
+            self._writers.put_nowait(conn)
+        for _ in range(self.size):
+            conn = await self._connect(readonly=True)
+            self._reader_connections.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._reader_connections + self._writer_connections:
+            await conn.close()
+        self._reader_connections.clear()
+        self._writer_connections.clear()
+        self._readers = asyncio.Queue()
+        self._writers = asyncio.Queue()
+
+    @property
+    def idle_readers(self):
+        return self._readers.qsize()
+
+    @asynccontextmanager
+    async def reader(self):
+        start = time.perf_counter()
+        conn = await self._readers.get()
+        acquired = time.perf_counter()
+        POOL_WAIT.observe(acquired - start, mode="read")
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+            POOL_HELD.observe(time.perf_counter() - acquired, mode="read")
+
+    @asynccontextmanager
+    async def idle_writer(self):
+        """A writer connection outside any transaction, for VACUUM and the like."""
+        start = time.perf_counter()
+        conn = await self._writers.get()
+        acquired = time.perf_counter()
+        POOL_WAIT.observe(acquired - start, mode="write")
+        try:
+            yield conn
+        finally:
+            self._writers.put_nowait(conn)
+            POOL_HELD.observe(time.perf_counter() - acquired, mode="write")
+
+    @abc.abstractmethod
+    async def compact(self, tables, pages, full_vacuum=False):
+        """Reclaim space and refresh planner statistics for ``tables``."""
+
+    @abc.abstractmethod
+    async def lock_schema(self, conn):
+        """Serialize schema migrations across processes for ``conn``'s transaction."""
+
+    @abc.abstractmethod
+    async def user_version(self, conn):
+        """The number of MIGRATIONS steps already applied."""
+
+    @abc.abstractmethod
+    async def set_user_version(self, conn, version):
+        pass
+
+    @abc.abstractmethod
+    async def publish(self, messages):
+        """Send each string to every process subscribed on this database."""
+
+    @abc.abstractmethod
+    async def subscribe(self, callback):
+        """Call ``callback(payload)`` for every published message, or with None if some may have been lost."""
+
+    @abc.abstractmethod
+    async def unsubscribe(self):
+        pass
+
+    @asynccontextmanager
+    async def writer(self):
+        # A connection runs one transaction at a time, so concurrent writers
+        # take turns on the pooled writer connections.
+        start = time.perf_counter()
+        conn = await self._writers.get()
+        acquired = time.perf_counter()
+        POOL_WAIT.observe(acquired - start, mode="write")
+        try:
+            await self._begin(conn)
+            yield conn
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+        finally:
+            self._writers.put_nowait(conn)
+            POOL_HELD.observe(time.perf_counter() - acquired, mode="write")
+
+
+class SQLitePool(ConnectionPool):
+    """aiosqlite pool with a single writer.
+
+    Cross-process notifications are rows in the ``notifications`` table,
+    polled by every subscriber. The writer takes the file lock at the start
+    of each transaction, so rows commit in id order.
+    """
+
+    dialect = "sqlite"
+    errors = (aiosqlite.Error,)
+
+    def __init__(self, path, readers=READER_POOL_SIZE):
+        super().__init__(path, readers, writers=1)
+        self._poller = None
+
+    async def _connect(self, readonly=False):
+        # IMMEDIATE takes the write lock when a transaction starts, so another
+        # process's writer waits on busy_timeout instead of failing midway.
+        conn = await aiosqlite.connect(self.target, isolation_level=None if readonly else "IMMEDIATE")
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        if readonly:
+            await conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    async def close(self):
+        await self.unsubscribe()
+        for conn in self._writer_connections:
+            await conn.execute("PRAGMA optimize")
+        await super().close()
+
+    async def lock_schema(self, conn):
+        await conn.execute("BEGIN IMMEDIATE")
+
+    async def compact(self, tables, pages, full_vacuum=False):
+        # Files created before incremental auto-vacuum need one full VACUUM
+        # to switch. It rewrites the whole file while holding the writer, so
+        # it only runs when the caller allows it; after that each run frees
+        # at most ``pages`` pages, so the write lock is held briefly.
+        async with self.idle_writer() as conn:
+            async with conn.execute("PRAGMA auto_vacuum") as cur:
+                mode = (await cur.fetchone())[0]
+            if mode == 2:
+                async with conn.execute(f"PRAGMA incremental_vacuum({int(pages)})") as cur:
+                    await cur.fetchall()
+            elif full_vacuum:
+                log.info("switching database to incremental vacuum", extra={"path": self.target})
+                await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                await conn.execute("VACUUM")
+            else:
+                log.warning(
+                    "database needs a full VACUUM to switch to incremental vacuum; set ALLOW_FULL_VACUUM=1 for one run",
+                    extra={"path": self.target}
+                )
+            for table in tables:
+                await conn.execute(f"ANALYZE {table}")
+
+    async def user_version(self, conn):
+        async with conn.execute("PRAGMA user_version") as cur:
+            return (await cur.fetchone())[0]
+
+    async def set_user_version(self, conn, version):
+        await conn.execute(f"PRAGMA user_version={version}")
+
+    async def publish(self, messages):
+        now = time.time()
+        async with self.writer() as conn:
+            await conn.executemany(
+                "INSERT INTO notifications (payload, created) VALUES (?, ?)", [(m, now) for m in messages]
+            )
+
+    async def subscribe(self, callback):
+        async with self.reader() as conn:
+            async with conn.execute("SELECT COALESCE(MAX(id), 0) FROM notifications") as cur:
+                last_id = (await cur.fetchone())[0]
+        self._poller = asyncio.create_task(self._poll(callback, last_id))
+
+    async def unsubscribe(self):
+        if self._poller is not None:
+            poller, self._poller = self._poller, None
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+
+    async def _poll(self, callback, last_id):
+        pruned = time.monotonic()
+        while True:
+            await asyncio.sleep(NOTIFY_POLL_INTERVAL)
+            try:
+                async with self.reader() as conn:
+                    async with conn.execute(
+                        "SELECT id, payload FROM notifications WHERE id > ? ORDER BY id", (last_id,)
+                    ) as cur:
+                        rows = await cur.fetchall()
+                for last_id, payload in rows:
+                    _deliver(callback, payload)
+                if time.monotonic() - pruned > NOTIFY_RETENTION:
+                    pruned = time.monotonic()
+                    async with self.writer() as conn:
+                        await conn.execute("DELETE FROM notifications WHERE created < ?", (time.time() - NOTIFY_RETENTION,))
+            except aiosqlite.Error as e:
+                log.warning("notification poll failed", extra={"error": str(e)})
+
+
+def _deliver(callback, payload):
+    # A failing subscriber must not end delivery for the rest of the process.
+    try:
+        callback(payload)
+    except Exception:
+        log.exception("notification callback failed")
+
+
+_PLACEHOLDER = re.compile(r"\?")
+_DDL_TYPES = (
+    (re.compile(r"\bINTEGER PRIMARY KEY AUTOINCREMENT\b", re.I), "BIGSERIAL PRIMARY KEY"),
+    (re.compile(r"\bINTEGER\b", re.I), "BIGINT"),
+    (re.compile(r"\bREAL\b", re.I), "DOUBLE PRECISION"),
+    (re.compile(r"\s*WITHOUT ROWID\b", re.I), ""),
+)
+
+
+@functools.lru_cache(maxsize=512)
+def to_postgres(sql):
+    """Rewrite a statement in utils.db's SQLite dialect for PostgreSQL."""
+    stripped = sql.strip()
+    head = stripped[:12].upper()
+    if head.startswith(("CREATE TABLE", "ALTER TABLE")):
+        for pattern, replacement in _DDL_TYPES:
+            stripped = pattern.sub(replacement, stripped)
+    if re.match(r"INSERT\s+OR\s+IGNORE\s+INTO", stripped, re.I):
+        stripped = re.sub(r"INSERT\s+OR\s+IGNORE\s+INTO", "INSERT INTO", stripped, count=1, flags=re.I)
+        stripped += " ON CONFLICT DO NOTHING"
+    count = 0
+
+    def number(_):
+        nonlocal count
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(number, stripped)
+
+
+def _rowcount(status):
+    # asyncpg returns the command tag, e.g. "INSERT 0 1" or "DELETE 3".
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (ValueError, AttributeError):
+        return -1
+
+
+class PostgresCursor:
+    """Lazily runs one statement; usable with ``await`` or ``async with``."""
+
+    def __init__(self, conn, sql, params):
+        self._conn = conn
+        self._sql = to_postgres(sql)
+        self._params = tuple(params)
+        self._rows = None
+        self._cursor = None
+        self._transaction = None
+        self.rowcount = -1
+
+    def __await__(self):
+        return self._execute().__await__()
+
+    async def _execute(self):
+        self.rowcount = _rowcount(await self._conn.execute(self._sql, *self._params))
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._transaction is not None:
+            await self._transaction.commit()
+            self._transaction = None
+
+    async def _fetch(self):
+        if self._rows is None:
+            self._rows = [tuple(row) for row in await self._conn.fetch(self._sql, *self._params)]
+            self.rowcount = len(self._rows)
+        return self._rows
+
+    async def fetchone(self):
+        rows = await self._fetch()
+        return rows.pop(0) if rows else None
+
+    async def fetchall(self):
+        rows = await self._fetch()
+        self._rows = []
+        return rows
+
+    async def fetchmany(self, size):
+        # Stream through a server-side cursor rather than loading every row.
+        if self._cursor is None:
+            if not self._conn.is_in_transaction():
+                self._transaction = self._conn.transaction(readonly=True)
+                await self._transaction.start()
+            self._cursor = await self._conn.cursor(self._sql, *self._params)
+        return [tuple(row) for row in await self._cursor.fetch(size)]
+
+
+class PostgresConnection:
+    """asyncpg connection behind the aiosqlite API subset utils.db uses."""
+
+    def __init__(self, conn):
+        self.raw = conn
+        self._transaction = None
+
+    def execute(self, sql, params=()):
+        return PostgresCursor(self.raw, sql, params)
+
+    async def executemany(self, sql, rows):
+        rows = list(rows)
+        if rows:
+            await self.raw.executemany(to_postgres(sql), rows)
+
+    async def begin(self):
+        self._transaction = self.raw.transaction()
+        await self._transaction.start()
+
+    async def commit(self):
+        if self._transaction is not None:
+            transaction, self._transaction = self._transaction, None
+            await transaction.commit()
+
+    async def rollback(self):
+        if self._transaction is not None:
+            transaction, self._transaction = self._transaction, None
+            await transaction.rollback()
+
+    async def close(self):
+        await self.raw.close()
+
+
+class PostgresPool(ConnectionPool):
+    """asyncpg pool with several writers.
+
+    Cross-process notifications use LISTEN/NOTIFY. NOTIFY is delivered when
+    the publishing transaction commits; if the listening connection drops,
+    subscribers get ``None`` (events may have been missed) and it reconnects.
+    """
+
+    dialect = "postgres"
+
+    def __init__(self, dsn, readers=READER_POOL_SIZE, writers=POSTGRES_WRITERS):
+        if asyncpg is None:
+            raise RuntimeError("DATABASE_URL points at PostgreSQL but asyncpg is not installed.")
+        super().__init__(dsn, readers, writers)
+        self.errors = (asyncpg.PostgresError, OSError)
+        self._listener = None
+        self._callback = None
+        self._reconnect = None
+
+    async def _connect(self, readonly=False):
+        settings = {"default_transaction_read_only": "on"} if readonly else {}
+        return PostgresConnection(await asyncpg.connect(self.target, server_settings=settings))
+
+    async def _begin(self, conn):
+        await conn.begin()
+
+    async def close(self):
+        await self.unsubscribe()
+        await super().close()
+
+    async def compact(self, tables, pages, full_vacuum=False):
+        # Plain VACUUM marks dead rows reusable without locking out writers;
+        # it cannot run inside a transaction block.
+        async with self.idle_writer() as conn:
+            await conn.raw.execute(f"VACUUM (ANALYZE) {', '.join(tables)}")
+
+    async def lock_schema(self, conn):
+        # Processes starting together take turns migrating.
+        await conn.execute("SELECT pg_advisory_xact_lock(hashtext('leaderboard_schema'))")
+
+    async def user_version(self, conn):
+        await conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        async with conn.execute("SELECT version FROM schema_version") as cur:
+            row = await cur.fetchone()
+        return row[0] if row else 0
+
+    async def set_user_version(self, conn, version):
+        await conn.execute("DELETE FROM schema_version")
+        await conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+
+    async def publish(self, messages):
+        async with self.writer() as conn:
+            await conn.executemany("SELECT pg_notify(?, ?)", [(NOTIFY_CHANNEL, m) for m in messages])
+
+    async def subscribe(self, callback):
+        self._callback = callback
+        await self._listen()
+
+    async def _listen(self):
+        self._listener = await asyncpg.connect(self.target)
+        await self._listener.add_listener(NOTIFY_CHANNEL, self._notified)
+        self._listener.add_termination_listener(self._terminated)
+
+    def _notified(self, conn, pid, channel, payload):
+        if self._callback is not None:
+            _deliver(self._callback, payload)
+
+    def _terminated(self, conn):
+        if self._callback is None:
+            return
+        log.warning("notification listener disconnected; reconnecting")
+        _deliver(self._callback, None)
+        self._reconnect = asyncio.create_task(self._relisten())
+
+    async def _relisten(self):
+        delay = 1
+        while True:
+            try:
+                await self._listen()
+                # Anything published while we were away is lost.
+                if self._callback is not None:
+                    _deliver(self._callback, None)
+                return
+            except (OSError, asyncpg.PostgresError) as e:
+                log.warning("notification listener reconnect failed", extra={"error": str(e)})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def unsubscribe(self):
+        self._callback = None
+        if self._reconnect is not None:
+            reconnect, self._reconnect = self._reconnect, None
+            reconnect.cancel()
+            await asyncio.gather(reconnect, return_exceptions=True)
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
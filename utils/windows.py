@@ -0,0 +1,57 @@
+from datetime import date, datetime, timedelta
+
+WINDOWS = ("all", "daily", "weekly", "monthly", "season")
+TITLES = {
+    "all": "🏆 Leaderboard",
+    "daily": "🏆 Daily Leaderboard",
+    "weekly": "🏆 Weekly Leaderboard",
+    "monthly": "🏆 Monthly Leaderboard",
+    "season": "🏆 Season Leaderboard",
+}
+DEFAULT_CONFIG = {"reset_hour": 0, "week_start": 0, "season_start": None, "season_days": 90}
+
+
+def with_defaults(config):
+    """``config`` with DEFAULT_CONFIG filled in for missing or None settings."""
+    return {**DEFAULT_CONFIG, **{k: v for k, v in (config or {}).items() if k in DEFAULT_CONFIG and v is not None}}
+
+
+def bucket(window, when, config=None):
+    """Return the ISO date starting the ``window`` period that contains ``when``.
+
+    Periods roll over at ``reset_hour`` UTC. Weeks start on ``week_start``
+    (0 = Monday). Seasons are ``season_days`` long counted from
+    ``season_start``. Returns None for "all", and for seasons when none
+    is configured or ``when`` falls before the first one.
+    """
+    config = with_defaults(config)
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    day = (when - timedelta(hours=config["reset_hour"])).date()
+    if window == "daily":
+        start = day
+    elif window == "weekly":
+        start = day - timedelta(days=(day.weekday() - config["week_start"]) % 7)
+    elif window == "monthly":
+        start = day.replace(day=1)
+    elif window == "season":
+        if not config["season_start"]:
+            return None
+        first = date.fromisoformat(config["season_start"])
+        if day < first:
+            return None
+        length = max(1, config["season_days"])
+        start = first + timedelta(days=(day - first).days // length * length)
+    else:
+        return None
+    return start.isoformat()
+
+
+def buckets(when, config=None):
+    """Return [(window, bucket)] for every rolled-up window ``when`` falls in."""
+    result = []
+    for window in WINDOWS[1:]:
+        start = bucket(window, when, config)
+        if start is not None:
+            result.append((window, start))
+    return result
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from utils import db
+from utils.ingest import IngestorClosed, InvalidSubmission, valid_score
+from utils.proofs import InvalidProof, Proof, reuse_flag
+
+log = logging.getLogger(__name__)
+
+WIZARD_TIMEOUT = float(os.getenv("WIZARD_TIMEOUT", "120"))
+SWEEP_INTERVAL = 60
+
+STEPS = ("username", "score", "image1", "image2")
+PROMPTS = {
+    "username": "🔹 Enter your **Username**:",
+    "score": "🔹 Enter your **Score** (number):",
+    "image1": "🔹 Upload your **first image proof** (as an attachment):",
+    "image2": "🔹 Upload your **second image proof** (as an attachment):",
+}
+
+
+class WizardState:
+    __slots__ = ("user_id", "guild_id", "step", "data", "expires", "lock")
+
+    def __init__(self, user_id, guild_id, step=STEPS[0], data=None, expires=0.0):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.step = step
+        self.data = data or {}
+        self.expires = expires
+        self.lock = asyncio.Lock()
+
+
+class SubmissionWizard:
+    """DM submission flow as an explicit per-user state machine.
+
+    ``active`` maps user id to that user's state, so ``handle`` finds the
+    right wizard with one dict lookup instead of running every pending
+    ``wait_for`` check. Each transition is written to the ``wizards`` table
+    and ``load`` restores unexpired wizards after a restart.
+    """
+
+    def __init__(self, bot, timeout=WIZARD_TIMEOUT):
+        self.bot = bot
+        self.timeout = timeout
+        self.active = {}
+        self._sweeper = None
+
+    async def load(self):
+        for user_id, guild_id, step, data, expires in await db.load_wizards(time.time()):
+            self.active[user_id] = WizardState(user_id, guild_id, step, json.loads(data), expires)
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            sweeper, self._sweeper = self._sweeper, None
+            sweeper.cancel()
+            await asyncio.gather(sweeper, return_exceptions=True)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            now = time.time()
+            for user_id in [u for u, state in self.active.items() if state.expires < now]:
+                del self.active[user_id]
+            await db.delete_expired_wizards(now)
+
+    async def _save(self, state):
+        state.expires = time.time() + self.timeout
+        await db.save_wizard(state.user_id, state.guild_id, state.step, json.dumps(state.data), state.expires)
+
+    async def _drop(self, state):
+        self.active.pop(state.user_id, None)
+        await db.delete_wizard(state.user_id)
+
+    def count(self, guild_id, exclude=None):
+        """Unexpired wizards for the guild, not counting ``exclude``'s."""
+        now = time.time()
+        return sum(
+            1 for state in self.active.values()
+            if state.guild_id == guild_id and state.expires >= now and state.user_id != exclude
+        )
+
+    async def begin(self, user_id, guild_id, limit=0):
+        """Start (or restart) a wizard and return the first prompt.
+
+        Returns None instead if ``limit`` other wizards for the guild are
+        already running. The check and the slot it admits happen before any
+        await, so concurrent callers can't both take the last slot.
+        """
+        # Restarting your own wizard replaces it, so it never needs a new slot.
+        if limit and self.count(guild_id, exclude=user_id) >= limit:
+            return None
+        state = WizardState(user_id, guild_id, expires=time.time() + self.timeout)
+        self.active[user_id] = state
+        await self._save(state)
+        return PROMPTS[state.step]
+
+    async def handle(self, message):
+        """Advance the author's wizard with a DM. Returns False if they have none."""
+        state = self.active.get(message.author.id)
+        if state is None:
+            return False
+        async with state.lock:
+            if self.active.get(message.author.id) is not state:
+                return True
+            if state.expires < time.time():
+                await self._drop(state)
+                await message.channel.send("⚠️ Submission failed or timed out. Run `/submit` again to start over.")
+                return True
+            try:
+                reply = await self._advance(state, message)
+            except Exception:
+                log.exception("wizard step failed", extra={"user_id": state.user_id, "step": state.step})
+                reply = "⚠️ Something went wrong. Please send that again."
+        if reply:
+            await message.channel.send(reply)
+        return True
+
+    async def _advance(self, state, message):
+        if state.step == "username":
+            username = message.content.strip()
+            if not username:
+                return PROMPTS["username"]
+            state.data["username"] = username
+        elif state.step == "score":
+            try:
+                score = int(message.content.strip())
+            except ValueError:
+                return "❌ The score must be a whole number. " + PROMPTS["score"]
+            if not valid_score(score):
+                return "❌ That score is too large. " + PROMPTS["score"]
+            state.data["score"] = score
+        else:
+            if not message.attachments:
+                return "❌ You must upload the image as an attachment. " + PROMPTS[state.step]
+            attachment = message.attachments[0]
+            try:
+                proof = await self.bot.proofs.fetch(attachment)
+            except InvalidProof as e:
+                return f"❌ {e} " + PROMPTS[state.step]
+            state.data[state.step] = [attachment.url, proof.sha256, proof.phash]
+
+        index = STEPS.index(state.step)
+        if index + 1 < len(STEPS):
+            state.step = STEPS[index + 1]
+            await self._save(state)
+            return PROMPTS[state.step]
+
+        data = state.data
+        urls, proofs = [], []
+        for step in ("image1", "image2"):
+            url, sha256, phash = data[step]
+            urls.append(url)
+            proofs.append(Proof(sha256, phash, None))
+        done, reply = await self.finish(message.author, state.guild_id, data["username"], data["score"], urls, proofs)
+        # Keep the saved state on failure so resending the last image retries.
+        if not done:
+            return f"{reply} Send your second image again to retry."
+        await self._drop(state)
+        return reply
+
+    async def finish(self, user, guild_id, username, score, urls, proofs):
+        """Queue a complete submission; returns (done, message to show the user).
+
+        ``done`` is False when nothing was saved and the user can retry.
+        """
+        try:
+            success = await self.bot.ingestor.submit(
+                user.id,
+                guild_id,
+                username,
+                score,
+                urls[0],
+                urls[1],
+                proofs[0].sha256,
+                proofs[1].sha256,
+                await reuse_flag(guild_id, proofs)
+            )
+        except IngestorClosed as e:
+            return False, f"⚠️ Submission failed or timed out: {e}"
+        except InvalidSubmission as e:
+            return True, f"❌ {e}"
+        except Exception:
+            log.exception("submission failed", extra={"guild_id": guild_id, "user_id": user.id})
+            return False, "⚠️ Your submission couldn't be saved just now."
+        if not success:
+            return True, "❌ You've already submitted for this guild."
+        try:
+            await db.record_proof_hashes(guild_id, user.id, [(p.sha256, p.phash) for p in proofs])
+        except Exception:
+            # The submission itself is saved; only reuse detection misses it.
+            log.exception("recording proof hashes failed", extra={"guild_id": guild_id, "user_id": user.id})
+        self.bot.notifier.submission_received(guild_id, user)
+        log.info("submission accepted", extra={"guild_id": guild_id, "user_id": user.id})
+        return True, "✅ Your submission was received and is pending review!"